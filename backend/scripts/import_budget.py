@@ -0,0 +1,67 @@
+"""
+Проверка времени импорта src.app.main (холодный старт каждого воркера uvicorn).
+
+Запускает `python -X importtime -c "import src.app.main"` в отдельных процессах
+и завершается с ошибкой, если лучшее из нескольких измерений превышает бюджет
+или если при старте импортируется библиотека, которая должна грузиться лениво.
+
+Запуск из каталога backend:
+    python scripts/import_budget.py --budget-ms 2000
+"""
+import argparse
+import subprocess
+import sys
+
+# Нужны только выгрузкам, при старте импортироваться не должны
+LAZY_MODULES = ("pandas", "numpy", "openpyxl", "pyarrow")
+
+
+def measure(module: str) -> dict[str, tuple[int, int]]:
+    """Возвращает модуль -> (собственное время, накопленное время) в микросекундах."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="src.app.main")
+    parser.add_argument("--budget-ms", type=float, default=2000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda timings: timings[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"{args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"Top {args.top} top-level packages by cumulative time:")
+    top_level = {name: timing for name, timing in best.items() if "." not in name}
+    for name, (_, cumulative_us) in sorted(
+        top_level.items(), key=lambda item: item[1][1], reverse=True,
+    )[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if eager := [name for name in LAZY_MODULES if name in best]:
+        print(f"FAIL: imported at startup, must be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time {total_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
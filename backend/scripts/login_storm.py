@@ -0,0 +1,101 @@
+"""
+Нагрузочная проверка: задержка /health во время шторма логинов.
+
+Пока N клиентов непрерывно логинятся (каждый логин - проверка bcrypt),
+отдельный клиент раз в интервал дёргает /health и меряет задержку.
+Если bcrypt блокирует event loop, p99 /health растёт до сотен миллисекунд.
+
+/health почти всегда отдаётся из кэша проверок (PROJECT_HEALTH_CACHE_TTL) и сам
+не ходит в БД и Redis, поэтому его задержка - это задержки event loop,
+а не время логина и не время проверки зависимостей. Время логина скрипт не меряет.
+
+Запуск против поднятого сервера (один воркер uvicorn, пользователь должен существовать):
+    python scripts/login_storm.py --url http://localhost:8000/api/v1 \\
+        --email admin@example.com --password secret --concurrency 50 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def login_forever(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    email: str,
+    password: str,
+    deadline: float,
+    counters: dict[int, int],
+) -> None:
+    while time.monotonic() < deadline:
+        response = await client.post(
+            f"{url}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+
+async def probe_health(
+    client: httpx.AsyncClient,
+    url: str,
+    deadline: float,
+    interval: float,
+) -> list[float]:
+    latencies = []
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        await client.get(f"{url}/health")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def percentile(values: list[float], percent: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        baseline = await probe_health(client, args.url, time.monotonic() + 3, args.interval)
+        deadline = time.monotonic() + args.duration
+        counters: dict[int, int] = {}
+        storm = [
+            login_forever(
+                client,
+                args.url,
+                email=args.email,
+                password=args.password,
+                deadline=deadline,
+                counters=counters,
+            )
+            for _ in range(args.concurrency)
+        ]
+        latencies, *_ = await asyncio.gather(
+            probe_health(client, args.url, deadline, args.interval),
+            *storm,
+        )
+
+    for name, values in (("idle", baseline), ("login storm", latencies)):
+        print(
+            f"/health {name:>11}: n={len(values)} "
+            f"p50={percentile(values, 50):.1f} ms p99={percentile(values, 99):.1f} ms "
+            f"max={max(values):.1f} ms",
+        )
+    print(f"login responses by status: {dict(sorted(counters.items()))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
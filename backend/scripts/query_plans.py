@@ -0,0 +1,287 @@
+"""
+Регрессия планов и задержек запросов к preprocessed_emails.
+
+Вызывает функции crud/preprocessed_email.py на базе из POSTGRES_*, перехватывает
+отправленный ими SQL, проверяет через EXPLAIN (ANALYZE), что таблица не читается
+последовательным сканированием и используется ожидаемый индекс, и что p95
+задержки вызова укладывается в бюджет. Завершается с ошибкой при регрессии.
+
+--seed дозаполняет таблицу синтетическими строками до заданного числа
+(ingest_id 'bench:N'), --cleanup удаляет их. Только для локальной базы.
+
+Запуск из каталога backend (миграции должны быть применены):
+    python scripts/query_plans.py --seed 1000000 --budget-ms 50
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.crud import preprocessed_email as preprocessed_email_crud
+from src.app.db.database import Session, async_engine
+from src.app.db.models.preprocessed_email import PreprocessedEmail, PreprocessedEmailFilter
+
+TABLE = PreprocessedEmail.__tablename__
+SEED_BATCH_SIZE = 100_000
+
+SEED_SQL = text(f"""
+INSERT INTO {TABLE} (
+    id, date, fio, object, object_number, object_type, phone_number,
+    email, emotional_color, question, short_question, ingest_id
+)
+SELECT
+    gen_random_uuid(),
+    DATE '2020-01-01' + (g % 2000)::int,
+    'Иванов Сергей ' || (g % 5000),
+    'ООО Объект ' || (g % 300),
+    'SN-' || g,
+    (ARRAY['ДГС ЭРИС-230', 'ДГС BLE Android', 'DGS230/IR-G20', 'ЭРИС-210',
+           'ЭРИС-414', 'ПГЭ', 'СГОЭС', 'ДСТ'])[1 + g % 8],
+    '+7900' || lpad((g % 10000000)::text, 7, '0'),
+    'user' || (g % 20000) || '@example.com',
+    (ARRAY['neutral', 'positive', 'negative', 'angry', 'urgent'])[1 + g % 5],
+    'Вопрос по калибровке датчика ' || md5(g::text),
+    'Калибровка ' || (g % 1000),
+    'bench:' || g
+FROM generate_series(CAST(:start AS bigint), CAST(:stop AS bigint)) AS g
+ON CONFLICT (ingest_id) DO NOTHING
+""")
+
+
+@dataclass
+class Sample:
+    """Существующая строка, от которой строятся параметры запросов."""
+    id: object
+    date: datetime.date
+    email: str
+    object_type: str
+    word: str
+
+
+@dataclass
+class Case:
+    name: str
+    call: Callable[[AsyncSession, Sample], Awaitable[object]]
+    # Индекс, который должен быть в плане (None - достаточно отсутствия Seq Scan)
+    index: str | None
+
+
+CASES = [
+    Case(
+        "list first page",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(session, limit=50),
+        "ix_preprocessed_emails_date_id",
+    ),
+    Case(
+        "list keyset page",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session, limit=50, after=(sample.date, sample.id),
+        ),
+        "ix_preprocessed_emails_date_id",
+    ),
+    Case(
+        "filter by email",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session, limit=50, filters=PreprocessedEmailFilter(email=sample.email),
+        ),
+        "ix_preprocessed_emails_email_date_id",
+    ),
+    Case(
+        "filter by date range",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session,
+            limit=50,
+            filters=PreprocessedEmailFilter(
+                date_from=sample.date - datetime.timedelta(days=7),
+                date_to=sample.date,
+            ),
+        ),
+        "ix_preprocessed_emails_date_id",
+    ),
+    Case(
+        "filter by emotional_color",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session, limit=50, filters=PreprocessedEmailFilter(emotional_color="angry"),
+        ),
+        None,
+    ),
+    Case(
+        "filter by object_type",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session, limit=50, filters=PreprocessedEmailFilter(object_type=sample.object_type),
+        ),
+        None,
+    ),
+    Case(
+        "full-text search",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails(
+            session, limit=50, filters=PreprocessedEmailFilter(q=sample.word),
+        ),
+        "ix_preprocessed_emails_search_vector",
+    ),
+    Case(
+        "count by email",
+        lambda session, sample: preprocessed_email_crud.count_preprocessed_emails(
+            session, PreprocessedEmailFilter(email=sample.email),
+        ),
+        "ix_preprocessed_emails_email_date_id",
+    ),
+    Case(
+        "lookup by id",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_email(
+            session, id=sample.id,
+        ),
+        "preprocessed_emails_pkey",
+    ),
+    Case(
+        "lookup by ids",
+        lambda session, sample: preprocessed_email_crud.get_preprocessed_emails_by_ids(
+            session, [sample.id],
+        ),
+        "preprocessed_emails_pkey",
+    ),
+]
+
+
+async def seed(rows: int) -> None:
+    async with Session() as session:
+        existing = (await session.execute(text(f"SELECT count(*) FROM {TABLE}"))).scalar_one()
+    if existing >= rows:
+        print(f"{TABLE}: {existing} rows, seeding skipped")
+        return
+    print(f"{TABLE}: {existing} rows, seeding up to {rows}")
+    # Нумерация продолжается после уже сгенерированных строк, иначе их ingest_id
+    # совпадут с новыми и ON CONFLICT молча пропустит вставку
+    async with Session() as session:
+        last = (await session.execute(text(
+            f"SELECT coalesce(max(substr(ingest_id, 7)::bigint), 0) FROM {TABLE} "
+            "WHERE ingest_id LIKE 'bench:%'",
+        ))).scalar_one()
+    seeded = 0
+    for start in range(last + 1, last + rows - existing + 1, SEED_BATCH_SIZE):
+        stop = min(last + rows - existing, start + SEED_BATCH_SIZE - 1)
+        async with Session() as session:
+            result = await session.execute(SEED_SQL, {"start": start, "stop": stop})
+            await session.commit()
+        seeded += result.rowcount
+        print(f"  seeded {seeded} rows")
+    async with async_engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"VACUUM ANALYZE {TABLE}"))
+
+
+async def cleanup() -> None:
+    async with Session() as session:
+        result = await session.execute(text(f"DELETE FROM {TABLE} WHERE ingest_id LIKE 'bench:%'"))
+        await session.commit()
+    print(f"{TABLE}: deleted {result.rowcount} seeded rows")
+
+
+async def pick_sample() -> Sample:
+    async with Session() as session:
+        row = (await session.execute(text(
+            f"SELECT id, date, email, object_type, question FROM {TABLE} "
+            "TABLESAMPLE SYSTEM (1) WHERE object_type IS NOT NULL LIMIT 1",
+        ))).one()
+    # Самое длинное слово вопроса - редкое, как типичный поисковый запрос
+    word = max(row.question.split(), key=len)
+    return Sample(row.id, row.date, row.email, row.object_type, word)
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def explain(statement: str, parameters) -> dict:
+    async with async_engine.connect() as conn:
+        result = await conn.exec_driver_sql(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters,
+        )
+        plan = result.scalar_one()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+async def run_case(case: Case, sample: Sample, runs: int) -> tuple[list[float], list[tuple]]:
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        latencies = []
+        for run in range(runs + 2):
+            statements.clear()
+            started = time.perf_counter()
+            async with Session() as session:
+                await case.call(session, sample)
+            # Первые два прогона - прогрев кеша страниц и подготовленных выражений
+            if run >= 2:
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    return latencies, list(statements)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", type=int, default=0, help="дозаполнить таблицу до N строк")
+    parser.add_argument("--cleanup", action="store_true", help="удалить сгенерированные строки")
+    parser.add_argument("--budget-ms", type=float, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        if args.cleanup:
+            await cleanup()
+            return 0
+        if args.seed:
+            await seed(args.seed)
+        sample = await pick_sample()
+
+        failed = False
+        for case in CASES:
+            latencies, statements = await run_case(case, sample, args.runs)
+            problems = []
+            for statement, parameters in statements:
+                nodes = list(plan_nodes(await explain(statement, parameters)))
+                if any(
+                    node["Node Type"] == "Seq Scan" and node.get("Relation Name") == TABLE
+                    for node in nodes
+                ):
+                    problems.append("sequential scan")
+                indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+                if case.index is not None and case.index not in indexes:
+                    problems.append(
+                        f"expected {case.index}, used {', '.join(sorted(indexes)) or 'no index'}",
+                    )
+            p95 = percentile(latencies, 95)
+            if p95 > args.budget_ms:
+                problems.append(f"p95 {p95:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+            print(
+                f"{'FAIL' if problems else 'ok':>4}  {case.name:<26} "
+                f"p50={percentile(latencies, 50):6.1f} ms p95={p95:6.1f} ms"
+                + (f"  {'; '.join(problems)}" if problems else ""),
+            )
+            failed = failed or bool(problems)
+        return 1 if failed else 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -7,7 +7,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.core.settings import get_project_settings
-from src.app.db.database import async_engine
+from src.app.db.database import Session
 
 project_settings = get_project_settings()
 
@@ -16,16 +16,13 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 async def get_db() -> AsyncGenerator[AsyncSession, Any]:
-    async with AsyncSession(async_engine) as session:
+    async with Session() as session:
         yield session
 
 @asynccontextmanager
 async def get_db_session() -> AsyncGenerator[AsyncSession, Any]:
-    session = AsyncSession(async_engine)
-    try:
+    async with Session() as session:
         yield session
-    finally:
-        await session.close()
 
 SessionDep = Annotated[AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
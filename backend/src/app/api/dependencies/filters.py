@@ -0,0 +1,7 @@
+from typing import Annotated
+
+from fastapi import Depends
+
+from src.app.db.models.preprocessed_email import PreprocessedEmailFilter
+
+PreprocessedEmailFilterDep = Annotated[PreprocessedEmailFilter, Depends(PreprocessedEmailFilter)]
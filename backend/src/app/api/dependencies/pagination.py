@@ -20,6 +20,17 @@ class PaginationParams(BaseModel):
         le=100,
         description="Maximum number of records to return",
     )
+    cursor: str | None = Field(
+        default=None,
+        description="Opaque cursor from the previous page (next_cursor); skip is ignored when set",
+    )
+    exact_count: bool = Field(
+        default=False,
+        description=(
+            "Return an exact (cached) total instead of a planner estimate "
+            "for the unfiltered email list"
+        ),
+    )
 
 
 PaginationDep = Annotated[PaginationParams, Depends(PaginationParams)]
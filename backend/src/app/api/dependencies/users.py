@@ -6,6 +6,7 @@ from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.api.dependencies.common import SessionDep, TokenDep
 from src.app.core import security
@@ -13,6 +14,7 @@ from src.app.core.settings import get_project_settings
 from src.app.crud import user as user_crud
 from src.app.db.models.user import Role, User
 from src.app.db.schemas import TokenPayload
+from src.app.modules.user_cache import get_user_cache
 
 project_settings = get_project_settings()
 
@@ -32,7 +34,7 @@ async def get_current_user(
             status_code=403,
             detail="Could not validate credentials",
         )
-    user = await session.get(User, token_data.sub)
+    user = await _get_user(session, token_data.sub)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -61,7 +63,13 @@ async def get_optional_user(
         token_data = TokenPayload(**payload)
     except (ValidationError):
         return None
-    return await session.get(User, token_data.sub)
+    return await _get_user(session, token_data.sub)
+
+
+async def _get_user(session: AsyncSession, user_id: str) -> User | None:
+    if (user_cache := get_user_cache()) is None:
+        return await session.get(User, user_id)
+    return await user_cache.get(session, user_id)
 
 
 async def get_user_or_404(
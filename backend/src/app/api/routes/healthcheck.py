@@ -1,19 +1,27 @@
 from fastapi import APIRouter, HTTPException
 
-from src.app.utils.healthcheck import check_postgres
+from src.app.core.security import get_password_hasher
+from src.app.db.database import get_pool_stats
+from src.app.modules.gigachat import get_gigachat
+from src.app.utils.healthcheck import health_checker
 
 router = APIRouter()
 
 @router.get("/health")
 async def health_check():
-    results = {
-        "postgres": await check_postgres(),
-    }
+    report = await health_checker.check()
 
-    if all(results.values()):
-        return {"status": "healthy", "details": results}
+    if report["status"] != "unhealthy":
+        return {
+            **report,
+            "metrics": {
+                "db_pool": get_pool_stats(),
+                "password_hashing": get_password_hasher().stats(),
+                "llm_cache": get_gigachat().cache_stats(),
+            },
+        }
 
     raise HTTPException(
         status_code=503,
-        detail={"status": "unhealthy", "details": results},
+        detail=report,
     )
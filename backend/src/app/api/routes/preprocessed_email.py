@@ -1,16 +1,27 @@
 from http import HTTPStatus
+import math
 import uuid
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 
+from src.app.api.dependencies.filters import PreprocessedEmailFilterDep
 from src.app.api.dependencies.pagination import PaginationDep
 from src.app.api.dependencies.users import SessionDep
+from src.app.modules.exports import get_export_job_manager
 from src.app.modules.gigachat import get_gigachat
+from src.app.modules.resilience import CircuitOpenError
 from src.app.service import preprocessed_email as preprocessed_email_service
-from src.app.db.models.preprocessed_email import PreprocessedEmailCreate
+from src.app.db.models.export_job import ExportFormat, ExportJobCreate
+from src.app.db.models.preprocessed_email import (
+    PreprocessedEmailAnswer,
+    PreprocessedEmailCreate,
+    PreprocessedEmailFilter,
+)
 
 router = APIRouter()
 
+ANSWER_SUBJECT = "Ответ на вопрос"
+
 
 @router.post("/")
 async def create_preproccessed_email(
@@ -27,26 +38,29 @@ async def create_preproccessed_email(
 async def get_preproccessed_emails(
     session: SessionDep,
     pagination: PaginationDep,
+    filters: PreprocessedEmailFilterDep,
 ):
     return await preprocessed_email_service.get_preprocessed_emails(
         session=session,
         skip=pagination.skip,
         limit=pagination.limit,
+        cursor=pagination.cursor,
+        filters=filters,
+        exact_count=pagination.exact_count,
     )
 
 @router.get("/csv", response_class=StreamingResponse)
 async def get_preprocessed_emails_csv(
-    session: SessionDep,
+    filters: PreprocessedEmailFilterDep,
     skip: int = 0,
-    limit: int = 1000,
+    limit: int | None = None,
 ):
-    stream = await preprocessed_email_service.get_preprocessed_emails_csv_stream(
-        session=session,
-        skip=skip,
-        limit=limit,
-    )
     return StreamingResponse(
-        iter([stream.getvalue()]),
+        preprocessed_email_service.iter_preprocessed_emails_csv(
+            skip=skip,
+            limit=limit,
+            filters=filters,
+        ),
         media_type="text/csv",
         headers={
             "Content-Disposition": 'attachment; filename="emails.csv"'
@@ -56,23 +70,86 @@ async def get_preprocessed_emails_csv(
 
 @router.get("/xlsx", response_class=StreamingResponse)
 async def get_preprocessed_emails_xlsx(
-    session: SessionDep,
+    filters: PreprocessedEmailFilterDep,
     skip: int = 0,
-    limit: int = 1000,
+    limit: int | None = None,
 ):
-    stream = await preprocessed_email_service.get_preprocessed_emails_xlsx_stream(
-        session=session,
-        skip=skip,
-        limit=limit,
-    )
+    return _file_export_response("xlsx", filters, skip, limit)
+
+
+@router.get("/parquet", response_class=StreamingResponse)
+async def get_preprocessed_emails_parquet(
+    filters: PreprocessedEmailFilterDep,
+    skip: int = 0,
+    limit: int | None = None,
+):
+    return _file_export_response("parquet", filters, skip, limit)
+
+
+@router.get("/arrow", response_class=StreamingResponse)
+async def get_preprocessed_emails_arrow(
+    filters: PreprocessedEmailFilterDep,
+    skip: int = 0,
+    limit: int | None = None,
+):
+    return _file_export_response("arrow", filters, skip, limit)
+
+
+def _file_export_response(
+    format: ExportFormat,
+    filters: PreprocessedEmailFilter,
+    skip: int,
+    limit: int | None,
+) -> StreamingResponse:
+    preprocessed_email_service.ensure_export_backend(format)
     return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        preprocessed_email_service.iter_preprocessed_emails_file(
+            format,
+            skip=skip,
+            limit=limit,
+            filters=filters,
+        ),
+        media_type=preprocessed_email_service.EXPORT_MEDIA_TYPES[format],
         headers={
-            "Content-Disposition": 'attachment; filename="emails.xlsx"'
+            "Content-Disposition": f'attachment; filename="emails.{format}"'
         }
     )
 
+@router.post("/export-jobs")
+async def create_export_job(
+    export_job_create: ExportJobCreate,
+):
+    return await get_export_job_manager().submit(export_job_create)
+
+
+@router.get("/export-jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+):
+    if not (job := await get_export_job_manager().get_job(job_id)):
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Export job not found")
+    return job
+
+
+@router.get("/export-jobs/{job_id}/file", response_class=FileResponse)
+async def download_export_job_file(
+    job_id: str,
+):
+    # FileResponse сам обрабатывает Range и If-Range, поэтому загрузку можно докачивать
+    manager = get_export_job_manager()
+    if not (job := await manager.get_job(job_id)):
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Export job not found")
+    if not (path := await manager.get_file(job_id)):
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail=f"Export file is not available, job status: {job.status}",
+        )
+    return FileResponse(
+        path,
+        media_type=preprocessed_email_service.EXPORT_MEDIA_TYPES[job.format],
+        filename=f"emails.{job.format}",
+    )
+
 @router.get("/help-answer")
 async def get_preproccessed_emails_help_answer(
     preprocessed_email_id: uuid.UUID,
@@ -83,8 +160,9 @@ async def get_preproccessed_emails_help_answer(
         id=preprocessed_email_id,
     )
     gigachat = get_gigachat()
-    return await gigachat.chat(
-        prompt="""
+    try:
+        return await gigachat.chat(
+            prompt="""
 Ты — опытный сотрудник службы технической поддержки компании, специализирующейся на газоаналитическом оборудовании и системах пожарообнаружения. Твоя задача — вежливо и понятно отвечать на вопросы пользователей.
 
 У тебя нет доступа к технической документации и инструкциям к конкретным моделям. Поэтому при ответе соблюдай следующие правила:
@@ -99,7 +177,13 @@ async def get_preproccessed_emails_help_answer(
     *   Призыв к действию или предложение помощи.
 5.  Язык: Отвечай на том же языке, на котором написан вопрос пользователя.
 """ + preprocessed_email.question,
-    )
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail="GigaChat is temporarily unavailable",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
 
 @router.post("/send-answer")
 async def send_answer(
@@ -114,9 +198,22 @@ async def send_answer(
         )
     ):
         return HTTPStatus.NOT_FOUND
-    return await preprocessed_email_service.send_email_to_user(
+    message_id = await preprocessed_email_service.send_email_to_user(
         email=preprocessed_email.email,
-        subject="Ответ на вопрос",
+        subject=ANSWER_SUBJECT,
         body=answer_text,
     )
-    # return HTTPStatus.NO_CONTENT
+    return {"message_id": message_id}
+
+
+@router.post("/send-answers")
+async def send_answers(
+    session: SessionDep,
+    answers: list[PreprocessedEmailAnswer],
+):
+    message_ids = await preprocessed_email_service.send_answers(
+        session=session,
+        answers=answers,
+        subject=ANSWER_SUBJECT,
+    )
+    return {"message_ids": message_ids}
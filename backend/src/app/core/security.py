@@ -1,15 +1,79 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Any
 
 import jwt
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
 from src.app.core.settings import get_project_settings
 
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 project_settings = get_project_settings()
 
+
+class PasswordHasher:
+    """
+    bcrypt в отдельном пуле потоков: хэширование занимает сотни миллисекунд
+    и не должно блокировать event loop. bcrypt отпускает GIL, поэтому потоки
+    работают параллельно. Число ожидающих операций ограничено: при переполнении
+    запрос сразу получает 503, а не встаёт в бесконечную очередь.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self._context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=rounds,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._workers = workers
+        self._max_pending = max_pending
+        # Операции в пуле: выполняемые и ждущие свободного потока
+        self._pending = 0
+        self._rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self._context.verify, password, hashed_password)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self._pending,
+            "queued": max(0, self._pending - self._workers),
+            "workers": self._workers,
+            "rejected": self._rejected,
+        }
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self._max_pending:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password checks, retry later",
+            )
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+
+@lru_cache(maxsize=1)
+def get_password_hasher() -> PasswordHasher:
+    return PasswordHasher(
+        rounds=project_settings.PASSWORD_HASH_ROUNDS,
+        workers=project_settings.PASSWORD_HASH_WORKERS,
+        max_pending=project_settings.PASSWORD_HASH_MAX_PENDING,
+    )
+
 def create_access_token(subject: str, expires_delta: timedelta) -> str:
     expire = datetime.now() + expires_delta
     to_encode = {"exp": expire, "sub": subject}
@@ -17,8 +81,8 @@ def create_access_token(subject: str, expires_delta: timedelta) -> str:
     return encoded_jwt
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await get_password_hasher().verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await get_password_hasher().hash(password)
@@ -10,6 +10,15 @@ class PostgresSettings(BaseSettings):
     PASSWORD: str
     DATABASE: str
     PORT: int
+    # Пул на каждый процесс uvicorn: workers * (POOL_SIZE + MAX_OVERFLOW)
+    # должно помещаться в max_connections Postgres
+    POOL_SIZE: int = Field(default=5, ge=1)
+    MAX_OVERFLOW: int = Field(default=10, ge=0)
+    POOL_TIMEOUT: float = Field(default=30)
+    POOL_RECYCLE: int = Field(default=30 * 60)
+    POOL_PRE_PING: bool = Field(default=True)
+    # 0 отключает кэш подготовленных выражений (нужно за pgbouncer в режиме transaction)
+    STATEMENT_CACHE_SIZE: int = Field(default=100, ge=0)
 
     @cached_property
     def async_db(self) -> str:
@@ -33,6 +42,20 @@ class ProjectSettings(BaseSettings):
     DEFAULT_QUERY_LIMIT: int = Field(default=100)
     SUPERUSER_EMAIL: str | None = None
     SUPERUSER_PASSWORD: str | None = None
+    COUNT_CACHE_TTL: int = Field(default=60 * 60)
+    EXPORT_BATCH_SIZE: int = Field(default=1000)
+    EXPORT_ROW_GROUP_SIZE: int = Field(default=64 * 1024)
+    # Верхняя граница строк в одной выгрузке (и при limit=None)
+    EXPORT_MAX_ROWS: int = Field(default=1_000_000, ge=1)
+    PASSWORD_HASH_ROUNDS: int = Field(default=12, ge=4, le=31)
+    PASSWORD_HASH_WORKERS: int = Field(default=2, ge=1)
+    PASSWORD_HASH_MAX_PENDING: int = Field(default=100, ge=1)
+    USER_CACHE_ENABLED: bool = Field(default=True)
+    USER_CACHE_REDIS: bool = Field(default=False)
+    USER_CACHE_TTL: int = Field(default=30)
+    USER_CACHE_MAX_SIZE: int = Field(default=1024, ge=1)
+    HEALTH_CACHE_TTL: float = Field(default=5)
+    HEALTH_PROBE_TIMEOUT: float = Field(default=2)
 
     model_config = SettingsConfigDict(
         env_prefix="PROJECT_",
@@ -48,6 +71,14 @@ class SMTPSettings(BaseSettings):
     TLS: bool = Field(default=True)
     SSL: bool = Field(default=False)
     PORT: int = Field(default=587)
+    TIMEOUT: float = Field(default=30)
+    POOL_SIZE: int = Field(default=2, ge=1)
+    OUTBOX_BATCH_SIZE: int = Field(default=20, ge=1)
+    OUTBOX_DEQUEUE_TIMEOUT: float = Field(default=5)
+    OUTBOX_VISIBILITY_TIMEOUT: float = Field(default=300)
+    OUTBOX_MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    OUTBOX_RETRY_DELAY: float = Field(default=10)
+    OUTBOX_RETRY_MAX_DELAY: float = Field(default=600)
 
     model_config = SettingsConfigDict(
         env_prefix="SMTP_",
@@ -60,6 +91,14 @@ class IMAPSettings(BaseSettings):
     PORT: int
     USER: str
     PASSWORD: str
+    FETCH_BATCH_SIZE: int = Field(default=50, ge=1)
+    PARTIAL_FETCH: bool = Field(default=True)
+    IDLE_TIMEOUT: float = Field(default=300)
+    POLL_INTERVAL: float = Field(default=30)
+    RECONNECT_MIN_DELAY: float = Field(default=1)
+    RECONNECT_MAX_DELAY: float = Field(default=300)
+    LOCK_TTL: float = Field(default=30)
+    LOCK_RENEW_INTERVAL: float = Field(default=10)
 
     model_config = SettingsConfigDict(
         env_prefix="IMAP_",
@@ -74,9 +113,59 @@ class RedisSettings(BaseSettings):
         env_prefix="REDIS_",
     )
 
+class EmailWorkerSettings(BaseSettings):
+    DEQUEUE_TIMEOUT: float = Field(default=5)
+    CONCURRENCY: int = Field(default=4, ge=1)
+    PREFETCH: int = Field(default=1, ge=1)
+    GIGACHAT_MAX_IN_FLIGHT: int = Field(default=4, ge=1)
+    GIGACHAT_SLOT_TTL: float = Field(default=30)
+    RELIABLE_QUEUE: bool = Field(default=True)
+    VISIBILITY_TIMEOUT: float = Field(default=120)
+    MAX_ATTEMPTS: int = Field(default=3, ge=1)
+    # 0 - неудачное письмо сразу возвращается в очередь, иначе - через паузу,
+    # растущую экспоненциально до RETRY_MAX_DELAY
+    RETRY_DELAY: float = Field(default=0, ge=0)
+    RETRY_MAX_DELAY: float = Field(default=300)
+    DEDUP_ENABLED: bool = Field(default=True)
+    DEDUP_TTL: int = Field(default=7 * 24 * 60 * 60)
+    DEDUP_PENDING_TTL: int = Field(default=30 * 60)
+    DEDUP_RETRY_DELAY: float = Field(default=30)
+    RESULT_BATCH_SIZE: int = Field(default=50, ge=1)
+    RESULT_FLUSH_INTERVAL: float = Field(default=2)
+
+    model_config = SettingsConfigDict(
+        env_prefix="EMAIL_WORKER_",
+    )
+
+class ExportSettings(BaseSettings):
+    DIR: str = Field(default="/tmp/exports")
+    CONCURRENCY: int = Field(default=2, ge=1)
+    DEQUEUE_TIMEOUT: float = Field(default=5)
+    JOB_TTL: int = Field(default=24 * 60 * 60)
+    FILE_TTL: int = Field(default=24 * 60 * 60)
+    CLEANUP_INTERVAL: float = Field(default=10 * 60)
+    VISIBILITY_TIMEOUT: float = Field(default=60)
+    MAX_ATTEMPTS: int = Field(default=3, ge=1)
+
+    model_config = SettingsConfigDict(
+        env_prefix="EXPORT_",
+    )
+
 class GigachatSettings(BaseSettings):
     URL: str
     AUTH_KEY: str
+    CACHE_ENABLED: bool = Field(default=True)
+    CACHE_REDIS: bool = Field(default=True)
+    CACHE_TTL: int = Field(default=24 * 60 * 60)
+    CACHE_MAX_SIZE: int = Field(default=1024, ge=1)
+    TIMEOUT: float = Field(default=30)
+    RATE_LIMIT: float = Field(default=1, gt=0)
+    RATE_BURST: int = Field(default=4, ge=1)
+    MAX_RETRIES: int = Field(default=3, ge=0)
+    RETRY_DELAY: float = Field(default=1)
+    RETRY_MAX_DELAY: float = Field(default=30)
+    BREAKER_FAILURE_THRESHOLD: int = Field(default=5, ge=1)
+    BREAKER_RESET_TIMEOUT: float = Field(default=30)
 
     model_config = SettingsConfigDict(
         env_prefix="GIGACHAT_",
@@ -111,3 +200,13 @@ def get_imap_settings() -> IMAPSettings:
 @lru_cache(maxsize=1)
 def get_gigachat_settings() -> GigachatSettings:
     return GigachatSettings() # type: ignore
+
+
+@lru_cache(maxsize=1)
+def get_email_worker_settings() -> EmailWorkerSettings:
+    return EmailWorkerSettings() # type: ignore
+
+
+@lru_cache(maxsize=1)
+def get_export_settings() -> ExportSettings:
+    return ExportSettings() # type: ignore
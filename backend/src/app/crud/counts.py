@@ -0,0 +1,19 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def estimate_count(
+    session: AsyncSession,
+    table_name: str,
+) -> int | None:
+    """
+    Оценка числа строк из статистики планировщика (pg_class.reltuples).
+    None, если таблица ещё ни разу не анализировалась.
+    """
+    statement = text(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)",
+    )
+    estimate = (await session.execute(statement, {"table_name": table_name})).scalar_one_or_none()
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
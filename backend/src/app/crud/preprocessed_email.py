@@ -1,10 +1,15 @@
+import re
+import uuid
+from collections.abc import AsyncIterator
 from typing import Any
-from sqlalchemy import Sequence, select
+from sqlalchemy import Row, Select, Sequence, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.core.settings import get_project_settings
 from src.app.db.models import PreprocessedEmail
-from src.app.db.models.preprocessed_email import PreprocessedEmailCreate
+from src.app.db.models.preprocessed_email import PreprocessedEmailCreate, PreprocessedEmailFilter
+from src.app.modules.counts import get_count_cache
 
 project_settings = get_project_settings()
 
@@ -17,25 +22,158 @@ async def get_preprocessed_email(
     user = result.scalar_one_or_none()
     return user
 
+async def get_preprocessed_emails_by_ids(
+    session: AsyncSession,
+    ids: Sequence[uuid.UUID],
+) -> Sequence[PreprocessedEmail]:
+    statement = select(PreprocessedEmail).where(PreprocessedEmail.id.in_(ids))
+    return (await session.execute(statement)).scalars().all()
+
 async def create_preprocessed_email(
     session: AsyncSession,
     preprocessed_email_create: PreprocessedEmailCreate,
 ) -> PreprocessedEmail:
+    # model_dump применяет сериализаторы PreprocessedEmailCreate (email в нижнем регистре),
+    # model_validate от самой модели их пропустил бы
     preprocessed_email = PreprocessedEmail.model_validate(
-        preprocessed_email_create,
+        preprocessed_email_create.model_dump(),
     )
     session.add(preprocessed_email)
     await session.commit()
     await session.refresh(preprocessed_email)
+    await get_count_cache().invalidate(PreprocessedEmail.__tablename__)
     return preprocessed_email
 
+async def create_preprocessed_emails(
+    session: AsyncSession,
+    preprocessed_emails: Sequence[PreprocessedEmail],
+) -> dict[str, uuid.UUID]:
+    """
+    Вставляет пачку строк одним INSERT ... ON CONFLICT DO NOTHING в одной транзакции.
+    Возвращает ingest_id -> id для реально вставленных строк.
+    Email приводится к нижнему регистру, как и в create_preprocessed_email:
+    фильтр списка сравнивает его без учёта регистра.
+    """
+    if not preprocessed_emails:
+        return {}
+    statement = (
+        insert(PreprocessedEmail)
+        .values([
+            {**preprocessed_email.model_dump(), "email": preprocessed_email.email.lower()}
+            for preprocessed_email in preprocessed_emails
+        ])
+        .on_conflict_do_nothing(index_elements=["ingest_id"])
+        .returning(PreprocessedEmail.ingest_id, PreprocessedEmail.id)
+    )
+    inserted = dict((await session.execute(statement)).tuples().all())
+    await session.commit()
+    if inserted:
+        await get_count_cache().invalidate(PreprocessedEmail.__tablename__)
+    return inserted
+
 async def get_preprocessed_emails(
     session: AsyncSession,
     skip: int = 0,
     limit: int = project_settings.DEFAULT_QUERY_LIMIT,
+    after: tuple[Any, uuid.UUID] | None = None,
+    filters: PreprocessedEmailFilter | None = None,
 ) -> Sequence[PreprocessedEmail]:
-    statement = select(PreprocessedEmail).offset(skip).limit(limit)
+    """
+    Страница писем в стабильном порядке (sort_by, id), по умолчанию date DESC.
+    Если передан after - keyset-пагинация от позиции (значение sort_by, id),
+    skip не используется.
+    """
+    filters = filters or PreprocessedEmailFilter()
+    sort_column = getattr(PreprocessedEmail, filters.sort_by)
+    statement = apply_ordering(apply_filters(select(PreprocessedEmail), filters), filters)
+    if after is not None:
+        position = tuple_(sort_column, PreprocessedEmail.id)
+        statement = statement.where(
+            position < tuple_(*after) if filters.order == "desc" else position > tuple_(*after),
+        )
+    else:
+        statement = statement.offset(skip)
+    statement = statement.limit(limit)
     preprocessed_emails = (await session.execute(
         statement,
     )).scalars().all()
-    return preprocessed_emails
\ No newline at end of file
+    return preprocessed_emails
+
+
+async def stream_preprocessed_email_rows(
+    session: AsyncSession,
+    columns: Sequence[str],
+    *,
+    skip: int = 0,
+    limit: int | None = None,
+    filters: PreprocessedEmailFilter | None = None,
+    batch_size: int = project_settings.EXPORT_BATCH_SIZE,
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Отдаёт выбранные колонки пачками по batch_size строк через серверный курсор,
+    не загружая всю выборку в память. Порядок - как у get_preprocessed_emails.
+    """
+    filters = filters or PreprocessedEmailFilter()
+    statement = select(*(getattr(PreprocessedEmail, column) for column in columns))
+    statement = apply_ordering(apply_filters(statement, filters), filters)
+    statement = statement.offset(skip).limit(limit).execution_options(yield_per=batch_size)
+    result = await session.stream(statement)
+    async for rows in result.partitions():
+        yield rows
+
+
+async def get_distinct_values(
+    session: AsyncSession,
+    column: str,
+) -> list[str]:
+    """Все непустые значения колонки (для категориальных колонок с малым числом значений)."""
+    sort_column = getattr(PreprocessedEmail, column)
+    statement = select(sort_column).where(sort_column.is_not(None)).distinct().order_by(sort_column)
+    return list((await session.execute(statement)).scalars().all())
+
+
+async def count_preprocessed_emails(
+    session: AsyncSession,
+    filters: PreprocessedEmailFilter | None = None,
+) -> int:
+    statement = select(func.count()).select_from(PreprocessedEmail)
+    statement = apply_filters(statement, filters or PreprocessedEmailFilter())
+    return (await session.execute(statement)).scalar_one()
+
+
+def has_conditions(filters: PreprocessedEmailFilter) -> bool:
+    """Есть ли в фильтре условия отбора (сортировка не считается)."""
+    return bool(filters.model_dump(exclude={"sort_by", "order"}, exclude_none=True))
+
+
+def apply_ordering(statement: Select, filters: PreprocessedEmailFilter) -> Select:
+    sort_column = getattr(PreprocessedEmail, filters.sort_by)
+    if filters.order == "desc":
+        return statement.order_by(sort_column.desc(), PreprocessedEmail.id.desc())
+    return statement.order_by(sort_column.asc(), PreprocessedEmail.id.asc())
+
+
+def apply_filters(statement: Select, filters: PreprocessedEmailFilter) -> Select:
+    if filters.date_from is not None:
+        statement = statement.where(PreprocessedEmail.date >= filters.date_from)
+    if filters.date_to is not None:
+        statement = statement.where(PreprocessedEmail.date <= filters.date_to)
+    if filters.emotional_color is not None:
+        statement = statement.where(PreprocessedEmail.emotional_color == filters.emotional_color)
+    if filters.object_type is not None:
+        statement = statement.where(PreprocessedEmail.object_type == filters.object_type)
+    if filters.object is not None:
+        # Символы шаблона LIKE во вводе ищутся буквально
+        pattern = re.sub(r"([\\%_])", r"\\\1", filters.object)
+        statement = statement.where(
+            PreprocessedEmail.object.ilike(f"%{pattern}%", escape="\\"),
+        )
+    if filters.email is not None:
+        statement = statement.where(PreprocessedEmail.email == filters.email.lower())
+    if filters.q:
+        statement = statement.where(
+            PreprocessedEmail.search_vector.op("@@")(
+                func.websearch_to_tsquery("russian", filters.q),
+            ),
+        )
+    return statement
@@ -1,8 +1,9 @@
+import uuid
 from collections.abc import Sequence
 from typing import Any
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.core.security import get_password_hash
@@ -12,6 +13,8 @@ from src.app.db.models.user import (
     UserCreate,
     UserUpdate,
 )
+from src.app.modules.counts import get_count_cache
+from src.app.modules.user_cache import get_user_cache
 
 project_settings = get_project_settings()
 
@@ -37,16 +40,16 @@ async def create_user(
             status_code=409,
             detail="Пользователь с таким email уже существует",
         )
-    print(user_create.password)
     user = User.model_validate(
         user_create,
         update={
-            "hashed_password": get_password_hash(user_create.password),
+            "hashed_password": await get_password_hash(user_create.password),
         },
     )
     session.add(user)
     await session.commit()
     await session.refresh(user)
+    await get_count_cache().invalidate(User.__tablename__)
     return user
 
 async def get_users(
@@ -60,12 +63,20 @@ async def get_users(
     )).scalars().all()
     return users
 
+async def count_users(
+    session: AsyncSession,
+) -> int:
+    statement = select(func.count()).select_from(User)
+    return (await session.execute(statement)).scalar_one()
+
 async def delete_user(
     session: AsyncSession,
     user_in: User,
 ) -> bool:
     await session.delete(user_in)
     await session.commit()
+    await get_count_cache().invalidate(User.__tablename__)
+    await _invalidate_user_cache(user_in.id)
     return True
 
 async def update_user(
@@ -81,4 +92,10 @@ async def update_user(
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    await _invalidate_user_cache(db_user.id)
     return db_user
+
+
+async def _invalidate_user_cache(user_id: uuid.UUID) -> None:
+    if (user_cache := get_user_cache()) is not None:
+        await user_cache.invalidate(user_id)
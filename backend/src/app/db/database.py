@@ -1,11 +1,75 @@
+import time
+
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.app.core.settings import get_postgres_settings
 
 settings = get_postgres_settings()
 
-async_engine = create_async_engine(settings.async_db)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает время получения соединения (ожидание
+    свободного слота, создание нового и pre-ping) и таймауты ожидания.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        wait = time.perf_counter() - started
+        self.checkouts += 1
+        self.checkout_wait_total += wait
+        self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        return connection
+
+    def stats(self) -> dict[str, float]:
+        capacity = self.size() + self._max_overflow
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "saturation": round(self.checkedout() / capacity, 3) if capacity else 0,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_avg_ms": round(
+                self.checkout_wait_total / self.checkouts * 1000, 3,
+            ) if self.checkouts else 0,
+            "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+        }
+
+
+async_engine = create_async_engine(
+    settings.async_db,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.POOL_SIZE,
+    max_overflow=settings.MAX_OVERFLOW,
+    pool_timeout=settings.POOL_TIMEOUT,
+    pool_recycle=settings.POOL_RECYCLE,
+    pool_pre_ping=settings.POOL_PRE_PING,
+    connect_args={
+        "statement_cache_size": settings.STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.STATEMENT_CACHE_SIZE,
+    },
+)
 Session = async_sessionmaker(async_engine)
 
 Base = declarative_base()
+
+
+def get_pool_stats() -> dict[str, float]:
+    return async_engine.sync_engine.pool.stats()
@@ -0,0 +1,24 @@
+import datetime
+from typing import Literal
+
+from sqlmodel import SQLModel
+
+from src.app.db.models.preprocessed_email import PreprocessedEmailFilter
+
+ExportFormat = Literal["csv", "xlsx", "parquet", "arrow"]
+ExportJobStatus = Literal["pending", "running", "done", "failed"]
+
+
+class ExportJobCreate(SQLModel):
+    format: ExportFormat = "csv"
+    filters: PreprocessedEmailFilter = PreprocessedEmailFilter()
+    skip: int = 0
+    limit: int | None = None
+
+
+class ExportJobPublic(SQLModel):
+    id: str
+    status: ExportJobStatus
+    format: ExportFormat
+    created_at: datetime.datetime
+    error: str | None = None
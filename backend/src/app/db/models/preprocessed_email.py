@@ -1,10 +1,18 @@
 import datetime
 import email
 import uuid
+from typing import Literal
 
 from pydantic import EmailStr, field_serializer
+from sqlalchemy import Column, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, SQLModel
 
+SEARCH_VECTOR_EXPRESSION = (
+    "to_tsvector('russian', "
+    "coalesce(question, '') || ' ' || coalesce(short_question, '') || ' ' || coalesce(fio, ''))"
+)
+
 
 class PreprocessedEmailBase(SQLModel):
     date: datetime.date
@@ -21,8 +29,25 @@ class PreprocessedEmailBase(SQLModel):
 
 class PreprocessedEmail(PreprocessedEmailBase, table=True):
     __tablename__ = "preprocessed_emails" # type: ignore
+    __table_args__ = (
+        # Порядок выдачи списка и keyset-пагинации
+        Index("ix_preprocessed_emails_date_id", "date", "id"),
+        # Фильтры списка: равенство по колонке + порядок выдачи по (date, id)
+        Index("ix_preprocessed_emails_email_date_id", "email", "date", "id"),
+        Index("ix_preprocessed_emails_emotional_color_date_id", "emotional_color", "date", "id"),
+        Index("ix_preprocessed_emails_object_type_date_id", "object_type", "date", "id"),
+        Index("ix_preprocessed_emails_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    # Идентификатор письма в очереди: защищает от повторной вставки при передоставке
+    ingest_id: str | None = Field(default=None, unique=True, index=True, nullable=True)
+    # Вычисляется самой БД для полнотекстового поиска, в выдачу не попадает
+    search_vector: str | None = Field(
+        default=None,
+        exclude=True,
+        sa_column=Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)),
+    )
 
 
 class PreprocessedEmailCreate(PreprocessedEmailBase):
@@ -35,6 +60,29 @@ class PreprocessedEmailPublic(PreprocessedEmailBase):
     id: uuid.UUID
 
 
+class PreprocessedEmailAnswer(SQLModel):
+    preprocessed_email_id: uuid.UUID
+    answer_text: str
+
+
+class PreprocessedEmailFilter(SQLModel):
+    """Фильтры и сортировка списка писем."""
+    date_from: datetime.date | None = None
+    date_to: datetime.date | None = None
+    emotional_color: str | None = None
+    object_type: str | None = None
+    # Поиск подстроки без учёта регистра
+    object: str | None = None
+    email: str | None = None
+    # Полнотекстовый поиск по question, short_question и fio
+    q: str | None = None
+    sort_by: Literal["date", "email", "emotional_color"] = "date"
+    order: Literal["asc", "desc"] = "desc"
+
+
 class PreprocessedEmailsPublic(SQLModel):
     data: list[PreprocessedEmailPublic]
     count: int
+    # True, если count - оценка планировщика, а не точный подсчёт
+    count_is_estimate: bool = False
+    next_cursor: str | None = None
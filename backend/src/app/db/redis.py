@@ -0,0 +1,14 @@
+import redis.asyncio as redis
+
+from src.app.core.settings import RedisSettings
+
+
+def get_redis_client(settings: RedisSettings) -> redis.Redis:
+    """Клиент Redis с ответами-строками; единый конструктор для всех модулей."""
+    return redis.Redis(
+        host=settings.HOST,
+        port=settings.PORT,
+        db=settings.DB,
+        encoding="utf-8",
+        decode_responses=True,
+    )
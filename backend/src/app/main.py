@@ -7,7 +7,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from src.app.api.main import api_router
 from src.app.core.settings import get_project_settings
+from src.app.modules.exports import get_export_job_manager
+from src.app.modules.listener import get_mailbox_listener
+from src.app.modules.outbox import get_email_outbox
 from src.app.modules.processor import get_email_processor
+from src.app.modules.user_cache import get_user_cache
 
 project_settings = get_project_settings()
 
@@ -20,7 +24,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
     email_worker = get_email_processor()
     email_worker.start()
+    mailbox_listener = get_mailbox_listener()
+    mailbox_listener.start()
+    export_job_manager = get_export_job_manager()
+    export_job_manager.start()
+    email_outbox = get_email_outbox()
+    email_outbox.start()
+    if (user_cache := get_user_cache()) is not None:
+        user_cache.start()
     yield
+    if user_cache is not None:
+        await user_cache.stop()
+    await email_outbox.stop()
+    await export_job_manager.stop()
+    await mailbox_listener.stop()
     await email_worker.stop()
 
 app = FastAPI(lifespan=lifespan)
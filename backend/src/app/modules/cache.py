@@ -0,0 +1,113 @@
+import logging
+import time
+from collections import OrderedDict
+
+from src.app.core.settings import RedisSettings
+from src.app.db.redis import get_redis_client
+
+
+class Cache:
+    """Интерфейс строкового кэша по ключу."""
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCache(Cache):
+    """LRU-кэш в памяти процесса с TTL на запись."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._items[key] = (time.monotonic() + self._ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+class RedisCache(Cache):
+    """Общий для всех процессов кэш в Redis."""
+
+    def __init__(self, redis_settings: RedisSettings, ttl: int, prefix: str):
+        self._redis_client = get_redis_client(redis_settings)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    async def get(self, key: str) -> str | None:
+        return await self._redis_client.get(f"{self._prefix}:{key}")
+
+    async def set(self, key: str, value: str) -> None:
+        await self._redis_client.set(f"{self._prefix}:{key}", value, ex=self._ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._redis_client.delete(f"{self._prefix}:{key}")
+
+
+class TieredCache(Cache):
+    """
+    Опрашивает уровни кэша по порядку (обычно память, затем Redis)
+    и заполняет верхние уровни при попадании в нижний.
+    """
+
+    def __init__(self, *tiers: Cache):
+        self._tiers = tiers
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> str | None:
+        for index, tier in enumerate(self._tiers):
+            try:
+                value = await tier.get(key)
+            except Exception as e:
+                logging.warning("Cache read error: %s", e)
+                continue
+            if value is not None:
+                self.hits += 1
+                for upper_tier in self._tiers[:index]:
+                    await upper_tier.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        for tier in self._tiers:
+            try:
+                await tier.set(key, value)
+            except Exception as e:
+                logging.warning("Cache write error: %s", e)
+
+    async def delete(self, key: str) -> None:
+        for tier in self._tiers:
+            try:
+                await tier.delete(key)
+            except Exception as e:
+                logging.warning("Cache delete error: %s", e)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
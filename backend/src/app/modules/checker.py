@@ -1,5 +1,11 @@
 import email
+import logging
+import re
+from collections import defaultdict
 from email.header import decode_header
+from email.parser import BytesFeedParser, BytesParser
+from email.utils import parseaddr
+from itertools import takewhile
 from src.app.modules.queue import get_email_queue
 from src.app.modules.dto import EmailData
 from aioimaplib import aioimaplib
@@ -8,80 +14,345 @@ from src.app.core.settings import get_redis_settings, get_imap_settings
 imap_settings = get_imap_settings()
 redis_settings = get_redis_settings()
 
+FETCH_UID_RE = re.compile(rb"UID (\d+)")
+UIDVALIDITY_RE = re.compile(rb"UIDVALIDITY (\d+)")
+UID_MARK_KEY = "imap:uid_mark"
+IMAP_TOKEN_RE = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()"]+')
+
 
 async def check_new_emails():
-    redis_client = get_email_queue()
-    if not await redis_client.is_empty:
-        return
+    imap_client, uidvalidity = await connect_imap()
+    await fetch_new_emails(imap_client, uidvalidity)
+    await imap_client.logout()
+
 
+async def connect_imap() -> tuple[aioimaplib.IMAP4_SSL, int | None]:
+    """Открывает сессию и выбирает INBOX. Возвращает клиента и UIDVALIDITY ящика."""
     imap_client = aioimaplib.IMAP4_SSL(imap_settings.HOST, imap_settings.PORT)
     await imap_client.wait_hello_from_server()
     await imap_client.login(imap_settings.USER, imap_settings.PASSWORD)
-    await imap_client.select("INBOX")
+    resp = await imap_client.select("INBOX")
+    uidvalidity = None
+    for line in resp.lines:
+        if match := UIDVALIDITY_RE.search(bytes(line)):
+            uidvalidity = int(match.group(1))
+            break
+    return imap_client, uidvalidity
+
+
+async def fetch_new_emails(imap_client: aioimaplib.IMAP4_SSL, uidvalidity: int | None) -> int:
+    """
+    Забирает новые письма по открытому соединению и кладёт их в очередь.
+
+    В Redis хранится отметка (UIDVALIDITY, последний UID). Пока UIDVALIDITY
+    не меняется, запрашиваются только письма с UID больше отметки.
+    Без отметки (первый запуск или сброс ящика) берутся все непрочитанные.
+    """
+    redis_client = get_email_queue()
+    last_uid = await get_last_uid(uidvalidity)
+    if last_uid is None:
+        resp = await imap_client.uid_search("UNSEEN", charset="UTF-8")
+    else:
+        resp = await imap_client.uid_search(f"UID {last_uid + 1}:*", charset=None)
 
-    resp = await imap_client.search("UNSEEN", charset="UTF-8")
-    
     if not resp.lines or resp.lines[0].upper().startswith(b"OK") and not any(b" " in line for line in resp.lines):
-        print("Нет новых (непрочитанных) писем")
-        await imap_client.logout()
-        return
+        logging.debug("No new emails")
+        return 0
 
     uid_line = resp.lines[0] if resp.lines else b""
     if isinstance(uid_line, bytes):
         uid_str_list = uid_line.decode().split()
     else:
         uid_str_list = []
-    if not uid_str_list:
-        await imap_client.logout()
-        return
-    print(uid_str_list)
-    uids = [int(u) for u in uid_str_list if u.isdigit()]
-    uids.sort(reverse=True)
-    recent_uids = uids[:5]
-    print(recent_uids)
-    for uid_int in recent_uids:
-        resp = await imap_client.uid("FETCH", str(uid_int), "(RFC822)")
-        if len(resp.lines) < 2:
+    # Диапазон n:* всегда содержит последний UID ящика, даже если он <= n
+    uids = sorted(
+        int(u) for u in uid_str_list
+        if u.isdigit() and (last_uid is None or int(u) > last_uid)
+    )
+    if not uids:
+        return 0
+    logging.info("Fetching %s new emails", len(uids))
+
+    batch_size = imap_settings.FETCH_BATCH_SIZE
+    enqueued = 0
+    for start in range(0, len(uids), batch_size):
+        batch = uids[start:start + batch_size]
+        if imap_settings.PARTIAL_FETCH:
+            emails_data = await fetch_text_parts(imap_client, batch)
+        else:
+            emails_data = await fetch_full_messages(imap_client, batch)
+        # Отметка не переходит через письмо, которое не удалось получить или
+        # разобрать: оно и все следующие будут запрошены в следующий раз
+        parsed = {int(email_data.uid) for email_data in emails_data}
+        failed = next((uid for uid in batch if uid not in parsed), None)
+        if failed is not None:
+            logging.warning("Email UID %s was not fetched, will retry", failed)
+            emails_data = [
+                email_data for email_data in emails_data if int(email_data.uid) < failed
+            ]
+        await redis_client.enqueue_many(
+            [email_data.__dict__ for email_data in emails_data],
+        )
+        enqueued += len(emails_data)
+        if failed is not None:
+            if (index := batch.index(failed)) > 0:
+                await set_last_uid(uidvalidity, batch[index - 1])
+            break
+        await set_last_uid(uidvalidity, batch[-1])
+    return enqueued
+
+
+async def fetch_full_messages(
+    imap_client: aioimaplib.IMAP4_SSL, uids: list[int],
+) -> list[EmailData]:
+    # PEEK не ставит письму флаг \Seen
+    resp = await imap_client.uid("FETCH", uid_set(uids), "(UID BODY.PEEK[])")
+    return [
+        email_data
+        for uid_int, raw_email in parse_fetch_response(resp.lines)
+        if (email_data := build_email_data(uid_int, raw_email)) is not None
+    ]
+
+
+async def fetch_text_parts(imap_client: aioimaplib.IMAP4_SSL, uids: list[int]) -> list[EmailData]:
+    """
+    Забирает только заголовки и текстовую часть писем (text/plain, а если её
+    нет - text/html), не трогая вложения.
+
+    Сначала одним запросом получает BODYSTRUCTURE и заголовки всей пачки,
+    затем запрашивает BODY.PEEK[n] пачками по номеру секции. Письма, структуру
+    которых разобрать не удалось, забираются целиком.
+    """
+    resp = await imap_client.uid(
+        "FETCH", uid_set(uids), "(UID BODYSTRUCTURE BODY.PEEK[HEADER])",
+    )
+    structures = parse_structure_response(resp.lines)
+
+    by_section: dict[str, list[int]] = defaultdict(list)
+    for uid_int in uids:
+        if (text_part := structures.get(uid_int, (None, None))[1]) is not None:
+            by_section[text_part[0]].append(uid_int)
+
+    bodies: dict[int, bytes] = {}
+    for section, section_uids in by_section.items():
+        resp = await imap_client.uid(
+            "FETCH", uid_set(section_uids), f"(UID BODY.PEEK[{section}])",
+        )
+        bodies.update(parse_fetch_response(resp.lines))
+
+    emails_data = []
+    for uid_int in uids:
+        if uid_int not in structures:
+            continue
+        header, text_part = structures[uid_int]
+        body = ""
+        if text_part is not None and uid_int in bodies:
+            _, encoding, charset = text_part
+            body = decode_text_part(bodies[uid_int], encoding, charset)
+        emails_data.append(
+            make_email_data(uid_int, BytesParser().parsebytes(header, headersonly=True), body),
+        )
+
+    if unparsed := [uid_int for uid_int in uids if uid_int not in structures]:
+        emails_data.extend(await fetch_full_messages(imap_client, unparsed))
+    return emails_data
+
+
+async def get_last_uid(uidvalidity: int | None) -> int | None:
+    """Последний обработанный UID или None, если отметки нет или она устарела."""
+    if uidvalidity is None:
+        return None
+    mark = await get_email_queue().get(UID_MARK_KEY)
+    if not mark:
+        return None
+    mark_uidvalidity, _, mark_uid = mark.partition(":")
+    if int(mark_uidvalidity) != uidvalidity:
+        return None
+    return int(mark_uid)
+
+
+async def set_last_uid(uidvalidity: int | None, uid: int) -> None:
+    if uidvalidity is not None:
+        await get_email_queue().set(UID_MARK_KEY, f"{uidvalidity}:{uid}")
+
+
+def uid_set(uids: list[int]) -> str:
+    """Сворачивает отсортированный список UID в IMAP sequence set: 1:3,7,9:10."""
+    ranges = []
+    first = last = uids[0]
+    for uid in uids[1:]:
+        if uid == last + 1:
+            last = uid
             continue
-        raw_email = b""
-        for line in resp.lines:
-            if line.startswith(b"*") or b"FETCH" in line or line.startswith(b")"):
-                continue
-            raw_email += line + b"\r\n"
+        ranges.append(f"{first}:{last}" if first != last else str(first))
+        first = last = uid
+    ranges.append(f"{first}:{last}" if first != last else str(first))
+    return ",".join(ranges)
+
 
-        if not raw_email.strip():
+def parse_fetch_response(lines: list) -> list[tuple[int, bytearray]]:
+    """
+    Разбирает ответ UID FETCH на пары (UID, тело письма).
+    aioimaplib отдаёт literal отдельным элементом bytearray сразу после
+    строки заголовка FETCH; UID сервер может прислать как до, так и после literal.
+    Literal не копируется: email-парсер принимает bytearray напрямую.
+    """
+    messages = []
+    for index, line in enumerate(lines):
+        if not isinstance(line, bytearray):
             continue
-        try:
-            msg = email.message_from_bytes(raw_email)
-        except Exception as e:
-            print(f"Ошибка парсинга письма UID {uid_int}: {e}")
+        header = lines[index - 1] if index > 0 else b""
+        trailer = lines[index + 1] if index + 1 < len(lines) else b""
+        match = FETCH_UID_RE.search(header) or FETCH_UID_RE.search(trailer)
+        if match is None:
             continue
-        subject_raw = decode_header(msg["Subject"] or "(без темы)")[0]
-        subject = subject_raw[0]
-        if isinstance(subject, bytes):
-            charset = subject_raw[1] or "utf-8"
-            try:
-                subject = subject.decode(charset, errors="replace")
-            except:
-                subject = "(ошибка декодирования темы)"
-        new_var = get_email_body(msg)
-        email_data = EmailData(
-            uid=str(uid_int),
-            subject=subject,
-            from_=msg.get("From", "").split("<")[1].strip().replace('>', ''),
-            date=msg.get("Date", ""),
-            body=new_var,
-        )
-        await redis_client.enqueue_email(email_data.__dict__)
-    await imap_client.logout()
+        messages.append((int(match.group(1)), line))
+    return messages
+
+
+def parse_structure_response(
+    lines: list,
+) -> dict[int, tuple[bytearray, tuple[str, str, str] | None]]:
+    """
+    Разбирает ответ на (UID BODYSTRUCTURE BODY.PEEK[HEADER]).
+    Возвращает UID -> (заголовки письма, (секция, кодировка, charset) text/plain части).
+    """
+    structures = {}
+    for index, line in enumerate(lines):
+        if not isinstance(line, bytearray) or index == 0:
+            continue
+        parsed = parse_imap_list(bytes(lines[index - 1]))
+        items = next((item for item in parsed if isinstance(item, list)), [])
+        # Если BODYSTRUCTURE сам содержал literal, строка заголовка обрезана
+        if not items or str(items[-1]).upper() != "BODY[HEADER]":
+            continue
+        fields = dict(zip(items[0::2], items[1::2], strict=False))
+        uid, structure = fields.get("UID"), fields.get("BODYSTRUCTURE")
+        if uid is None or not isinstance(structure, list):
+            continue
+        structures[int(uid)] = (line, find_text_part(structure))
+    return structures
+
+
+def parse_imap_list(data: bytes) -> list:
+    """
+    Разбирает скобочный список IMAP в python-списки.
+    NIL превращается в None, строки в кавычках раскавычиваются.
+    Незакрытые скобки (перед literal) закрываются автоматически.
+    """
+    stack: list[list] = [[]]
+    for token in IMAP_TOKEN_RE.findall(data):
+        if token == b"(":
+            stack.append([])
+        elif token == b")":
+            if len(stack) > 1:
+                closed = stack.pop()
+                stack[-1].append(closed)
+        elif token.startswith(b"{"):
+            continue
+        elif token.startswith(b'"'):
+            unquoted = re.sub(rb"\\(.)", rb"\1", token[1:-1])
+            stack[-1].append(unquoted.decode("utf-8", errors="replace"))
+        elif token.upper() == b"NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token.decode("utf-8", errors="replace"))
+    while len(stack) > 1:
+        closed = stack.pop()
+        stack[-1].append(closed)
+    return stack[0]
+
+
+def find_text_part(structure: list) -> tuple[str, str, str] | None:
+    """
+    Ищет в BODYSTRUCTURE первую text/plain часть, не являющуюся вложением.
+    Если её нет (письмо только в HTML), берёт первую text/html часть.
+    """
+    return find_part(structure, "plain") or find_part(structure, "html")
+
+
+def find_part(structure: list, subtype: str, section: str = "") -> tuple[str, str, str] | None:
+    """Ищет в BODYSTRUCTURE первую text/<subtype> часть, не являющуюся вложением."""
+    if structure and isinstance(structure[0], list):
+        children = takewhile(lambda child: isinstance(child, list), structure)
+        for number, child in enumerate(children, start=1):
+            child_section = f"{section}.{number}" if section else str(number)
+            if (found := find_part(child, subtype, child_section)) is not None:
+                return found
+        return None
+    if len(structure) < 7:
+        return None
+    if str(structure[0]).lower() != "text" or str(structure[1]).lower() != subtype:
+        return None
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and str(disposition[0]).lower() == "attachment":
+        return None
+    params = structure[2] if isinstance(structure[2], list) else []
+    params = {
+        str(key).lower(): value
+        for key, value in zip(params[0::2], params[1::2], strict=False)
+    }
+    return section or "1", structure[5] or "7bit", params.get("charset") or "utf-8"
+
+
+def decode_text_part(body: bytearray, encoding: str, charset: str) -> str:
+    """Декодирует содержимое секции по Content-Transfer-Encoding и charset из BODYSTRUCTURE."""
+    parser = BytesFeedParser()
+    parser.feed(
+        f'Content-Type: text/plain; charset="{charset}"\r\n'
+        f"Content-Transfer-Encoding: {encoding}\r\n\r\n".encode(),
+    )
+    parser.feed(body)
+    part = parser.close()
+    payload = part.get_payload(decode=True) or b""
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def build_email_data(uid_int: int, raw_email: bytearray) -> EmailData | None:
+    if not raw_email.strip():
+        return None
+    try:
+        msg = email.message_from_bytes(raw_email)
+    except Exception as e:
+        logging.warning("Email UID %s parse error: %s", uid_int, e)
+        return None
+    return make_email_data(uid_int, msg, get_email_body(msg))
+
+
+def make_email_data(uid_int: int, msg: email.message.Message, body: str) -> EmailData:
+    subject_raw = decode_header(msg["Subject"] or "(без темы)")[0]
+    subject = subject_raw[0]
+    if isinstance(subject, bytes):
+        charset = subject_raw[1] or "utf-8"
+        try:
+            subject = subject.decode(charset, errors="replace")
+        except:
+            subject = "(ошибка декодирования темы)"
+    return EmailData(
+        uid=str(uid_int),
+        subject=subject,
+        from_=parseaddr(msg.get("From", ""))[1],
+        date=msg.get("Date", ""),
+        body=body,
+        message_id=(msg.get("Message-ID") or "").strip(),
+    )
 
 def get_email_body(msg: email.message.Message) -> str:
+    text = ""
     if msg.is_multipart():
+        html = ""
         for part in msg.walk():
             ctype = part.get_content_type()
             disp = str(part.get("Content-Disposition"))
             if ctype == "text/plain" and "attachment" not in disp:
                 text = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+            elif ctype == "text/html" and "attachment" not in disp and not html:
+                html = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+        # Письмо только в HTML: как и при частичной загрузке, берём text/html
+        text = text or html
     else:
         text = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
     if text.endswith("Success\r\n"):
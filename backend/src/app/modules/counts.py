@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+
+from src.app.core.settings import RedisSettings, get_project_settings, get_redis_settings
+from src.app.db.redis import get_redis_client
+
+
+class CountCache:
+    """
+    Кэш точных COUNT(*) в Redis.
+
+    Ключ включает версию таблицы; вставка или удаление строк увеличивает
+    версию (invalidate), и все закэшированные подсчёты по таблице устаревают разом.
+    Та же версия ключует кэш файлов выгрузки.
+    """
+
+    def __init__(self, redis_settings: RedisSettings, ttl: int, prefix: str = "count"):
+        self._redis_client = get_redis_client(redis_settings)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    async def get_or_count(
+        self,
+        table: str,
+        params: dict,
+        count: Callable[[], Awaitable[int]],
+    ) -> int:
+        try:
+            version = await self.version(table)
+            params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+            key = f"{self._prefix}:{table}:{version}:{params_hash}"
+            if (cached := await self._redis_client.get(key)) is not None:
+                return int(cached)
+        except Exception as e:
+            logging.warning("Count cache read error: %s", e)
+            return await count()
+        total = await count()
+        try:
+            await self._redis_client.set(key, total, ex=self._ttl)
+        except Exception as e:
+            logging.warning("Count cache write error: %s", e)
+        return total
+
+    async def version(self, table: str) -> str:
+        """
+        Текущая версия данных таблицы. Начальное значение - время в наносекундах,
+        чтобы после очистки Redis версии не совпали со старыми.
+        """
+        key = self._version_key(table)
+        await self._redis_client.set(key, time.time_ns(), nx=True)
+        return await self._redis_client.get(key)
+
+    async def invalidate(self, table: str) -> None:
+        key = self._version_key(table)
+        try:
+            async with self._redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(key, time.time_ns(), nx=True)
+                pipe.incr(key)
+                await pipe.execute()
+        except Exception as e:
+            logging.warning("Count cache invalidation error: %s", e)
+
+    def _version_key(self, table: str) -> str:
+        return f"{self._prefix}:{table}:version"
+
+
+@lru_cache(maxsize=1)
+def get_count_cache() -> CountCache:
+    redis_settings = get_redis_settings()
+    project_settings = get_project_settings()
+    return CountCache(redis_settings, ttl=project_settings.COUNT_CACHE_TTL)
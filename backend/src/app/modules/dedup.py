@@ -0,0 +1,142 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+from src.app.core.settings import RedisSettings, get_email_worker_settings, get_redis_settings
+from src.app.db.redis import get_redis_client
+
+PENDING_PREFIX = "pending:"
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Проверка и захват отпечатков одной операцией. Отпечатки, уже занятые другим
+# письмом, дают значение оригинала; свободные отпечатки дубля привязываются
+# к сохранённому оригиналу. Новое письмо (или повторная доставка того же)
+# занимает свои отпечатки токеном pending:... на короткий pending_ttl
+CLAIM_SCRIPT = """
+local original = false
+for _, key in ipairs(KEYS) do
+    local value = redis.call('get', key)
+    if value and value ~= ARGV[1] then
+        original = value
+        break
+    end
+end
+if original then
+    if string.sub(original, 1, #ARGV[4]) ~= ARGV[4] then
+        for _, key in ipairs(KEYS) do
+            redis.call('set', key, original, 'NX', 'EX', ARGV[3])
+        end
+    end
+    return original
+end
+for _, key in ipairs(KEYS) do
+    redis.call('set', key, ARGV[1], 'EX', ARGV[2])
+end
+return false
+"""
+
+# Снятие только своих отпечатков: чужие (уже привязанные) не трогаются
+RELEASE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('del', key)
+    end
+end
+return 0
+"""
+
+
+def is_pending(original: str) -> bool:
+    """Оригинал ещё обрабатывается и в БД его пока нет."""
+    return original.startswith(PENDING_PREFIX)
+
+
+class EmailDeduplicator:
+    """
+    Отсекает повторные письма до вызова GigaChat.
+
+    Письмо считается дублем, если уже встречался его Message-ID или
+    нормализованное тело от того же отправителя. Отпечатки хранятся в Redis
+    с TTL; значение - id строки PreprocessedEmail, созданной по оригиналу,
+    или pending:<ingest_id>, пока оригинал ещё обрабатывается. Пока оригинал
+    в обработке, дубль не подтверждается, а откладывается (см. is_pending):
+    если оригинал не сохранится, дубль обработается как новое письмо.
+    Отметка pending живёт pending_ttl, поэтому отпечатки оригинала, который
+    так и не сохранился (dead-letter, падение воркера), освобождаются сами.
+
+    Связь дубля с оригиналом хранится только в Redis (до истечения ttl),
+    в БД строка для дубля не создаётся.
+    """
+
+    def __init__(
+        self,
+        redis_settings: RedisSettings,
+        ttl: int,
+        pending_ttl: int,
+        prefix: str = "dedup",
+    ):
+        self._redis_client = get_redis_client(redis_settings)
+        self._ttl = ttl
+        self._pending_ttl = pending_ttl
+        self._prefix = prefix
+        self._claim = self._redis_client.register_script(CLAIM_SCRIPT)
+        self._release = self._redis_client.register_script(RELEASE_SCRIPT)
+
+    def fingerprints(self, email_data: dict) -> list[str]:
+        keys = []
+        if message_id := (email_data.get("message_id") or "").strip():
+            keys.append(f"{self._prefix}:msgid:{self._hash(message_id)}")
+        body = WHITESPACE_RE.sub(" ", email_data.get("body") or "").strip().casefold()
+        if body:
+            sender = (email_data.get("from_") or "").strip().lower()
+            keys.append(f"{self._prefix}:body:{self._hash(sender + chr(0) + body)}")
+        return keys
+
+    async def claim(self, email_data: dict) -> str | None:
+        """
+        Регистрирует письмо. Возвращает None для нового письма
+        или значение отпечатка оригинала для дубля.
+        """
+        if not (keys := self.fingerprints(email_data)):
+            return None
+        return await self._claim(
+            keys=keys,
+            args=[self._token(email_data), self._pending_ttl, self._ttl, PENDING_PREFIX],
+        )
+
+    async def link(self, email_data: dict, preprocessed_email_id: str):
+        """Привязывает отпечатки письма к сохранённой строке PreprocessedEmail."""
+        if keys := self.fingerprints(email_data):
+            async with self._redis_client.pipeline(transaction=True) as pipe:
+                for key in keys:
+                    pipe.set(key, preprocessed_email_id, ex=self._ttl)
+                await pipe.execute()
+
+    async def release(self, email_data: dict):
+        """Снимает отпечатки, если обработка оригинала не удалась."""
+        if keys := self.fingerprints(email_data):
+            await self._release(keys=keys, args=[self._token(email_data)])
+
+    def _token(self, email_data: dict) -> str:
+        # Без ingest_id (письмо положено в очередь не листенером) отличаем письмо
+        # от других по хешу всего содержимого: при повторной доставке он тот же
+        ingest_id = email_data.get("ingest_id") or self._hash(
+            json.dumps(email_data, sort_keys=True, ensure_ascii=False),
+        )
+        return PENDING_PREFIX + ingest_id
+
+    @staticmethod
+    def _hash(value: str) -> str:
+        return hashlib.sha256(value.encode()).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_email_deduplicator() -> EmailDeduplicator:
+    redis_settings = get_redis_settings()
+    worker_settings = get_email_worker_settings()
+    return EmailDeduplicator(
+        redis_settings,
+        ttl=worker_settings.DEDUP_TTL,
+        pending_ttl=worker_settings.DEDUP_PENDING_TTL,
+    )
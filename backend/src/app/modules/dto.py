@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, field
 
 @dataclass
 class EmailData:
@@ -7,3 +8,7 @@ class EmailData:
     from_: str
     date: str
     body: str
+    message_id: str = ""
+    # Уникален для каждого попадания письма в очередь; повторная доставка
+    # из очереди сохраняет его, а повторная отправка письма клиентом - нет
+    ingest_id: str = field(default_factory=lambda: uuid.uuid4().hex)
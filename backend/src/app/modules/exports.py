@@ -0,0 +1,253 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+
+from src.app.core.settings import (
+    ExportSettings,
+    RedisSettings,
+    get_export_settings,
+    get_redis_settings,
+)
+from src.app.db.models.export_job import ExportJobCreate, ExportJobPublic
+from src.app.db.models.preprocessed_email import PreprocessedEmail
+from src.app.db.redis import get_redis_client
+from src.app.modules.counts import get_count_cache
+from src.app.modules.queue import Delivery, ReliableQueue
+from src.app.service import preprocessed_email as preprocessed_email_service
+
+
+class ExportJobManager:
+    """
+    Фоновые выгрузки писем.
+
+    Задача кладётся в надёжную очередь Redis и выполняется одним из воркеров
+    приложения. Пока задача выполняется, воркер продлевает её аренду; если под
+    упал, задача по истечении аренды возвращается в очередь и её доделывает
+    другой воркер. После MAX_ATTEMPTS прерванных запусков задача помечается failed.
+    Готовый файл хранится на диске под именем, вычисленным из параметров
+    выгрузки и версии данных таблицы, поэтому одинаковые запросы получают
+    тот же файл, пока в таблицу не добавятся новые строки.
+    """
+
+    def __init__(self, redis_settings: RedisSettings, settings: ExportSettings):
+        self._redis_client = get_redis_client(redis_settings)
+        self._dir = Path(settings.DIR)
+        self._concurrency = settings.CONCURRENCY
+        self._dequeue_timeout = settings.DEQUEUE_TIMEOUT
+        self._job_ttl = settings.JOB_TTL
+        self._file_ttl = settings.FILE_TTL
+        self._cleanup_interval = settings.CLEANUP_INTERVAL
+        self._max_attempts = settings.MAX_ATTEMPTS
+        self._requeue_interval = settings.VISIBILITY_TIMEOUT / 3
+        self._queue_name = "export_jobs"
+        # Элемент очереди - id задачи. Попытки считаются в хеше задачи (_run_job),
+        # поэтому очередь отправляет в dead-letter только после лишней попытки,
+        # когда задача уже помечена failed
+        self._queue = ReliableQueue(
+            redis_settings,
+            queue_name=self._queue_name,
+            reliable=True,
+            visibility_timeout=settings.VISIBILITY_TIMEOUT,
+            max_attempts=settings.MAX_ATTEMPTS + 1,
+        )
+
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        """Запуск воркеров выгрузки (вызывать в startup)."""
+        if not self._tasks:
+            self._stopping = False
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._tasks = [
+                asyncio.create_task(self._consume(worker_id))
+                for worker_id in range(self._concurrency)
+            ]
+            self._tasks.append(asyncio.create_task(self._cleanup_periodically()))
+            self._tasks.append(asyncio.create_task(self._requeue_periodically()))
+            logging.info("Export worker started with %s consumers", self._concurrency)
+
+    async def stop(self) -> None:
+        """Корректная остановка (вызывать в shutdown)."""
+        self._stopping = True
+        if self._tasks:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            logging.info("Export worker stopped")
+
+    async def submit(self, export_job_create: ExportJobCreate) -> ExportJobPublic:
+        """
+        Создаёт задачу выгрузки. Если файл с такими параметрами уже готов
+        или выгружается, возвращает соответствующую задачу без повторной работы.
+        """
+        preprocessed_email_service.ensure_export_backend(export_job_create.format)
+        version = await get_count_cache().version(PreprocessedEmail.__tablename__)
+        params = export_job_create.model_dump(mode="json")
+        key = hashlib.sha256(
+            json.dumps({**params, "version": version}, sort_keys=True).encode(),
+        ).hexdigest()
+
+        path = self._file_path(key, export_job_create.format)
+
+        if (existing_id := await self._redis_client.get(self._key_name(key))) is not None:
+            existing = await self.get_job(existing_id)
+            if existing is not None and (
+                existing.status in ("pending", "running")
+                or (existing.status == "done" and path.exists())
+            ):
+                return existing
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "done" if path.exists() else "pending",
+            "format": export_job_create.format,
+            "key": key,
+            "params": json.dumps(params),
+            "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        }
+        async with self._redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_name(job_id), mapping=job)
+            pipe.expire(self._job_name(job_id), self._job_ttl)
+            pipe.set(self._key_name(key), job_id, ex=self._job_ttl)
+            if job["status"] == "pending":
+                pipe.rpush(self._queue_name, job_id)
+            await pipe.execute()
+        if job["status"] == "done":
+            # Продлеваем жизнь файла, который снова понадобился
+            path.touch()
+        return ExportJobPublic.model_validate(job)
+
+    async def get_job(self, job_id: str) -> ExportJobPublic | None:
+        if not (job := await self._redis_client.hgetall(self._job_name(job_id))):
+            return None
+        return ExportJobPublic.model_validate(job)
+
+    async def get_file(self, job_id: str) -> Path | None:
+        """Путь к готовому файлу задачи или None, если файла нет."""
+        job = await self._redis_client.hgetall(self._job_name(job_id))
+        if job.get("status") != "done":
+            return None
+        path = self._file_path(job["key"], job["format"])
+        return path if path.exists() else None
+
+    async def _consume(self, worker_id: int) -> None:
+        while not self._stopping:
+            try:
+                for delivery in await self._queue.dequeue_blocking(self._dequeue_timeout):
+                    await self._run_job(delivery)
+            except Exception as e:
+                logging.exception("Export worker %s error: %s", worker_id, e)
+                await asyncio.sleep(3)
+
+    async def _run_job(self, delivery: Delivery) -> None:
+        job_id = delivery.raw
+        job_name = self._job_name(job_id)
+        if not (job := await self._redis_client.hgetall(job_name)):
+            await self._queue.ack(delivery)
+            return
+        export_job_create = ExportJobCreate.model_validate_json(job["params"])
+        path = self._file_path(job["key"], job["format"])
+        if path.exists():
+            await self._redis_client.hset(job_name, "status", "done")
+            await self._queue.ack(delivery)
+            return
+        # Попытка засчитывается до начала работы: запуск, прерванный падением пода,
+        # тоже считается
+        if await self._redis_client.hincrby(job_name, "attempts", 1) > self._max_attempts:
+            logging.error("Export job %s interrupted too many times", job_id)
+            await self._redis_client.hset(
+                job_name, mapping={"status": "failed", "error": "export was interrupted"},
+            )
+            await self._queue.ack(delivery)
+            return
+        await self._redis_client.hset(job_name, "status", "running")
+        # Пишем во временный файл и атомарно переименовываем,
+        # чтобы недописанный файл никогда не попал в кэш
+        temp_path = path.with_name(f"{path.name}.{job_id}.tmp")
+        try:
+            with temp_path.open("wb") as output:
+                await preprocessed_email_service.write_preprocessed_emails_export(
+                    output,
+                    export_job_create.format,
+                    skip=export_job_create.skip,
+                    limit=export_job_create.limit,
+                    filters=export_job_create.filters,
+                )
+            os.replace(temp_path, path)
+        except asyncio.CancelledError:
+            # Остановка приложения: задачу доделает следующий запущенный воркер,
+            # штатная остановка попыткой не считается
+            await self._redis_client.hset(job_name, "status", "pending")
+            await self._redis_client.hincrby(job_name, "attempts", -1)
+            await self._queue.requeue_front([delivery])
+            raise
+        except Exception as e:
+            logging.exception("Export job %s failed: %s", job_id, e)
+            await self._redis_client.hset(job_name, mapping={"status": "failed", "error": str(e)})
+            await self._queue.ack(delivery)
+            return
+        finally:
+            temp_path.unlink(missing_ok=True)
+        await self._redis_client.hset(job_name, "status", "done")
+        await self._queue.ack(delivery)
+        logging.info("Export job %s done: %s", job_id, path.name)
+
+    async def _requeue_periodically(self) -> None:
+        """
+        Продлевает аренды выполняемых задач и возвращает в очередь задачи
+        упавших воркеров.
+        """
+        while not self._stopping:
+            try:
+                await self._queue.extend_leases()
+                if requeued := await self._queue.requeue_expired():
+                    logging.warning("Requeued %s interrupted export jobs", requeued)
+            except Exception as e:
+                logging.exception("Export requeue error: %s", e)
+            await asyncio.sleep(self._requeue_interval)
+
+    async def _cleanup_periodically(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.to_thread(self._cleanup)
+            except Exception as e:
+                logging.exception("Export cleanup error: %s", e)
+            await asyncio.sleep(self._cleanup_interval)
+
+    def _cleanup(self) -> None:
+        """Удаляет файлы, к которым не обращались дольше FILE_TTL."""
+        expires_before = time.time() - self._file_ttl
+        for path in self._dir.iterdir():
+            try:
+                if path.stat().st_mtime < expires_before:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+    def _file_path(self, key: str, format: str) -> Path:
+        return self._dir / f"{key}.{format}"
+
+    @staticmethod
+    def _job_name(job_id: str) -> str:
+        return f"export_job:{job_id}"
+
+    @staticmethod
+    def _key_name(key: str) -> str:
+        return f"export_key:{key}"
+
+
+@lru_cache(maxsize=1)
+def get_export_job_manager() -> ExportJobManager:
+    redis_settings = get_redis_settings()
+    settings = get_export_settings()
+    return ExportJobManager(redis_settings, settings)
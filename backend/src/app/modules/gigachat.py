@@ -1,30 +1,125 @@
 import asyncio
+from email.utils import parsedate_to_datetime
+import logging
+import random
 import time
 import uuid
+from collections.abc import Callable
 import httpx
 from functools import lru_cache
-from src.app.core.settings import GigachatSettings, get_gigachat_settings
+from src.app.core.settings import (
+    GigachatSettings,
+    RedisSettings,
+    get_gigachat_settings,
+    get_redis_settings,
+)
+from src.app.modules.cache import Cache, InMemoryCache, RedisCache, TieredCache
+from src.app.modules.llm_cache import make_cache_key
+from src.app.modules.resilience import CircuitBreaker, TokenBucket
+
+# 429 - превышена квота, 5xx - временный сбой на стороне сервиса
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After бывает числом секунд или HTTP-датой."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 
 class Gigachat:
+    """
+    Клиент GigaChat.
+
+    Запросы к модели проходят через token bucket в Redis, общий для всех
+    процессов и реплик и настроенный под квоту. Временные ошибки (429, 5xx,
+    сетевые) повторяются с экспоненциальной паузой со случайным разбросом,
+    а Retry-After от сервиса имеет приоритет. Серия неудач размыкает
+    предохранитель: пока он разомкнут, запросы сразу получают CircuitOpenError,
+    а воркер обработки писем не забирает новые письма из очереди.
+    """
+
     OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
     CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+    MODELS_URL = "https://gigachat.devices.sberbank.ru/api/v1/models"
 
-    def __init__(self, settings: GigachatSettings, scope: str = "GIGACHAT_API_PERS"):
+    def __init__(
+        self,
+        settings: GigachatSettings,
+        redis_settings: RedisSettings,
+        scope: str = "GIGACHAT_API_PERS",
+        cache: Cache | None = None,
+    ):
         self.auth_key = settings.AUTH_KEY
         self.scope = scope
         self._model = "GigaChat-2"
+        self._cache = cache
 
         self._access_token: str | None = None
         self._expires_at: float = 0
         self._lock = asyncio.Lock()
 
-        self._client = httpx.AsyncClient(timeout=30, verify=False)
+        self._max_retries = settings.MAX_RETRIES
+        self._retry_delay = settings.RETRY_DELAY
+        self._retry_max_delay = settings.RETRY_MAX_DELAY
+        self._rate_limiter = TokenBucket(
+            redis_settings,
+            "gigachat:rate_limit",
+            settings.RATE_LIMIT,
+            settings.RATE_BURST,
+        )
+        self.breaker = CircuitBreaker(
+            settings.BREAKER_FAILURE_THRESHOLD,
+            settings.BREAKER_RESET_TIMEOUT,
+        )
+
+        self._client = httpx.AsyncClient(timeout=settings.TIMEOUT, verify=False)
+
+    async def chat(
+        self,
+        prompt: str,
+        model: str = "GigaChat",
+        temperature: float = 0,
+        validate: Callable[[str], object] | None = None,
+    ) -> str:
+        """
+        Ответ модели на prompt.
+
+        validate проверяет ответ перед записью в кэш: если он бросает
+        исключение, ответ не кэшируется, а исключение пробрасывается вызывающему.
+        Запись кэша, не прошедшая проверку, удаляется и модель вызывается заново.
+        """
+        # Кэшируем только детерминированные ответы
+        if self._cache is None or temperature != 0:
+            return await self._chat(prompt, model, temperature)
+        key = make_cache_key(model, temperature, prompt)
+        if (cached := await self._cache.get(key)) is not None:
+            try:
+                if validate is not None:
+                    validate(cached)
+                return cached
+            except Exception as e:
+                logging.warning("Dropping invalid cached GigaChat response: %s", e)
+                await self._cache.delete(key)
+        content = await self._chat(prompt, model, temperature)
+        if validate is not None:
+            validate(content)
+        await self._cache.set(key, content)
+        return content
 
-    async def chat(self, prompt: str, model: str = "GigaChat", temperature: float = 0) -> str:
+    async def _chat(self, prompt: str, model: str, temperature: float) -> str:
         await self._ensure_token()
-        response = await self._client.post(
+        response = await self._post(
             self.CHAT_URL,
+            rate_limited=True,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
                 "Content-Type": "application/json",
@@ -37,23 +132,92 @@ class Gigachat:
                 "temperature": temperature,
             },
         )
-        response.raise_for_status()
         data = response.json()
         return data["choices"][0]["message"]["content"]
 
+    async def _post(self, url: str, rate_limited: bool = False, **kwargs) -> httpx.Response:
+        """POST с повторами временных ошибок и учётом предохранителя."""
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            if rate_limited:
+                await self._rate_limiter.acquire()
+            try:
+                response = await self._client.post(url, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                if attempt >= self._max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning("GigaChat request error: %r, retry in %.1fs", e, delay)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    # Сервис жив, просто просит подождать
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                if retry_after is not None and retry_after > self._retry_max_delay:
+                    # Ждать внутри запроса слишком долго: размыкаем предохранитель
+                    self.breaker.trip(retry_after)
+                    response.raise_for_status()
+                if attempt >= self._max_retries:
+                    response.raise_for_status()
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                logging.warning(
+                    "GigaChat responded %s, retry in %.1fs", response.status_code, delay,
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self._retry_max_delay, self._retry_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1)
+
+    async def ping(self) -> None:
+        """
+        Проверка доступности: запрос списка моделей (модель не вызывается).
+
+        Идёт одним запросом мимо повторов, token bucket и предохранителя:
+        неудачная проверка не должна размыкать его для воркера, а разомкнутый
+        предохранитель - скрывать, что сервис уже ответил.
+        """
+        await self._ensure_token(direct=True)
+        response = await self._client.get(
+            self.MODELS_URL,
+            headers={"Authorization": f"Bearer {self._access_token}"},
+        )
+        response.raise_for_status()
+
+    def cache_stats(self) -> dict[str, int] | None:
+        """Попадания и промахи кэша ответов в этом процессе; None, если кэш выключен."""
+        if isinstance(self._cache, TieredCache):
+            return self._cache.stats()
+        return None
+
+    async def wait_available(self) -> None:
+        """Ждёт, пока предохранитель разрешит запросы к GigaChat."""
+        await self.breaker.wait_closed()
+
     async def close(self):
         await self._client.aclose()
 
-    async def _ensure_token(self):
+    async def _ensure_token(self, direct: bool = False):
         if self._access_token and time.time() < self._expires_at:
             return
         async with self._lock:
             if self._access_token and time.time() < self._expires_at:
                 return
-            await self._refresh_token()
+            await self._refresh_token(direct)
 
-    async def _refresh_token(self):
-        response = await self._client.post(
+    async def _refresh_token(self, direct: bool = False):
+        # direct - без повторов и предохранителя (для ping)
+        post = self._client.post if direct else self._post
+        response = await post(
             self.OAUTH_URL,
             headers={
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -78,4 +242,12 @@ class Gigachat:
 @lru_cache(maxsize=1)
 def get_gigachat() -> Gigachat:
     settings = get_gigachat_settings()
-    return Gigachat(settings)
\ No newline at end of file
+    cache = None
+    if settings.CACHE_ENABLED:
+        tiers: list[Cache] = [
+            InMemoryCache(settings.CACHE_MAX_SIZE, settings.CACHE_TTL),
+        ]
+        if settings.CACHE_REDIS:
+            tiers.append(RedisCache(get_redis_settings(), settings.CACHE_TTL, prefix="llm_cache"))
+        cache = TieredCache(*tiers)
+    return Gigachat(settings, get_redis_settings(), cache=cache)
\ No newline at end of file
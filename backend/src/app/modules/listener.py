@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+
+from aioimaplib import aioimaplib
+
+from src.app.core.settings import IMAPSettings, RedisSettings, get_imap_settings, get_redis_settings
+from src.app.db.redis import get_redis_client
+from src.app.modules.checker import connect_imap, fetch_new_emails
+from src.app.modules.locks import RedisLock
+
+
+class MailboxListener:
+    """
+    Долгоживущая IMAP-сессия: держит одно соединение и забирает новые письма
+    сразу по IDLE-уведомлению сервера. Если сервер не умеет IDLE, опрашивает
+    ящик раз в POLL_INTERVAL секунд по тому же соединению.
+    При обрыве переподключается с экспоненциальной задержкой.
+
+    Слушатель стартует в каждом процессе uvicorn, но ящик читает только один:
+    тот, кто держит блокировку в Redis. Остальные ждут и подхватывают чтение,
+    если владелец блокировки умер и она истекла по LOCK_TTL.
+    """
+
+    LOCK_NAME = "mailbox_listener:lock"
+    STATUS_NAME = "mailbox_listener:status"
+
+    def __init__(self, settings: IMAPSettings, redis_settings: RedisSettings):
+        self._idle_timeout = settings.IDLE_TIMEOUT
+        self._poll_interval = settings.POLL_INTERVAL
+        self._reconnect_min_delay = settings.RECONNECT_MIN_DELAY
+        self._reconnect_max_delay = settings.RECONNECT_MAX_DELAY
+        self._lock_ttl = settings.LOCK_TTL
+        self._lock_renew_interval = settings.LOCK_RENEW_INTERVAL
+        self._lock = RedisLock(redis_settings, self.LOCK_NAME, settings.LOCK_TTL)
+        self._redis_client = get_redis_client(redis_settings)
+
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._leader = False
+        self._connected = False
+        self._last_check_at: float | None = None
+        self._failures = 0
+
+    def start(self) -> None:
+        """Запуск слушателя (вызывать в startup)."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logging.info("Mailbox listener started")
+
+    async def stop(self) -> None:
+        """Корректная остановка (вызывать в shutdown)."""
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logging.info("Mailbox listener stopped")
+
+    def status(self) -> dict:
+        """Состояние IMAP-сессии этого процесса."""
+        return {
+            "leader": self._leader,
+            "connected": self._connected,
+            "last_check_at": self._last_check_at,
+            "failures": self._failures,
+        }
+
+    async def shared_status(self) -> dict:
+        """
+        Состояние IMAP-сессии владельца блокировки, опубликованное в Redis.
+        Пустой словарь - ящик сейчас никто не читает.
+        """
+        if not (status := await self._redis_client.hgetall(self.STATUS_NAME)):
+            return {}
+        return {
+            "connected": status.get("connected") == "1",
+            "last_check_at": float(status["last_check_at"]) if status["last_check_at"] else None,
+            "failures": int(status.get("failures", 0)),
+        }
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                acquired = await self._lock.acquire()
+            except Exception as e:
+                logging.warning("Mailbox listener lock error: %s", e)
+                acquired = False
+            if not acquired:
+                await asyncio.sleep(self._lock_renew_interval)
+                continue
+            self._leader = True
+            logging.info("Mailbox listener acquired the lock, reading the mailbox")
+            session = asyncio.create_task(self._run_session())
+            try:
+                await self._hold_lock()
+            finally:
+                session.cancel()
+                await asyncio.gather(session, return_exceptions=True)
+                self._leader = False
+                await self._release_lock()
+            if not self._stopping:
+                logging.warning("Mailbox listener lost the lock, stopped reading the mailbox")
+
+    async def _hold_lock(self) -> None:
+        """Продлевает блокировку и публикует статус, пока она не потеряна."""
+        while not self._stopping:
+            await self._publish_status()
+            await asyncio.sleep(self._lock_renew_interval)
+            try:
+                if not await self._lock.renew():
+                    return
+            except Exception as e:
+                # Не продлили вовремя - блокировка могла уйти другому процессу
+                logging.warning("Mailbox listener lock renew error: %s", e)
+                return
+
+    async def _release_lock(self) -> None:
+        try:
+            await self._redis_client.delete(self.STATUS_NAME)
+            await self._lock.release()
+        except Exception as e:
+            logging.warning("Mailbox listener lock release error: %s", e)
+
+    async def _publish_status(self) -> None:
+        try:
+            async with self._redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(self.STATUS_NAME, mapping={
+                    "connected": int(self._connected),
+                    "last_check_at": self._last_check_at or "",
+                    "failures": self._failures,
+                })
+                pipe.expire(self.STATUS_NAME, int(self._lock_ttl))
+                await pipe.execute()
+        except Exception as e:
+            logging.warning("Mailbox listener status error: %s", e)
+
+    async def _run_session(self) -> None:
+        while not self._stopping:
+            imap_client = None
+            try:
+                imap_client, uidvalidity = await connect_imap()
+                self._connected = True
+                await self._listen(imap_client, uidvalidity)
+            except Exception as e:
+                self._connected = False
+                self._failures += 1
+                delay = min(
+                    self._reconnect_max_delay,
+                    self._reconnect_min_delay * 2 ** (self._failures - 1),
+                )
+                logging.warning("IMAP session error: %s. Reconnecting in %.0f s", e, delay)
+                await asyncio.sleep(delay)
+            finally:
+                self._connected = False
+                if imap_client is not None:
+                    await self._logout(imap_client)
+
+    async def _listen(self, imap_client: aioimaplib.IMAP4_SSL, uidvalidity: int | None) -> None:
+        supports_idle = "IDLE" in imap_client.protocol.capabilities
+        if not supports_idle:
+            logging.info("IMAP server has no IDLE capability, falling back to polling")
+        while not self._stopping:
+            await fetch_new_emails(imap_client, uidvalidity)
+            self._last_check_at = time.time()
+            # Сессия рабочая только после успешной выборки: если падает
+            # fetch_new_emails, пауза между переподключениями продолжает расти
+            self._failures = 0
+            if supports_idle:
+                await self._wait_idle(imap_client)
+            else:
+                await asyncio.sleep(self._poll_interval)
+                # NOOP заставляет сервер прислать EXISTS и держит сессию живой
+                await imap_client.noop()
+
+    async def _wait_idle(self, imap_client: aioimaplib.IMAP4_SSL) -> None:
+        """Ждёт уведомление о новом письме или истечение IDLE_TIMEOUT."""
+        idle = await imap_client.idle_start(timeout=self._idle_timeout)
+        try:
+            while imap_client.has_pending_idle():
+                push = await imap_client.wait_server_push()
+                if push == aioimaplib.STOP_WAIT_SERVER_PUSH:
+                    break
+                if any(b"EXISTS" in line for line in push):
+                    break
+        finally:
+            imap_client.idle_done()
+            await asyncio.wait_for(idle, self._poll_interval)
+
+    @staticmethod
+    async def _logout(imap_client: aioimaplib.IMAP4_SSL) -> None:
+        try:
+            await imap_client.logout()
+        except Exception:
+            pass
+
+
+@lru_cache(maxsize=1)
+def get_mailbox_listener() -> MailboxListener:
+    settings = get_imap_settings()
+    return MailboxListener(settings, get_redis_settings())
@@ -0,0 +1,6 @@
+import hashlib
+
+
+def make_cache_key(model: str, temperature: float, prompt: str) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    return f"{model}:{temperature}:{prompt_hash}"
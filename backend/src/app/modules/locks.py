@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import random
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from src.app.core.settings import RedisSettings
+from src.app.db.redis import get_redis_client
+
+# Продление и снятие только своей блокировки: значение ключа - токен владельца
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Слоты семафора - элементы ZSET с временем истечения; время берётся у Redis,
+# чтобы расхождение часов между хостами не влияло на истечение слотов
+ACQUIRE_SLOT_SCRIPT = """
+local now = redis.call('time')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+if redis.call('zcard', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('zadd', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    return 1
+end
+return 0
+"""
+RENEW_SLOT_SCRIPT = """
+local now = redis.call('time')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+return redis.call('zadd', KEYS[1], 'XX', 'CH', now + tonumber(ARGV[1]), ARGV[2])
+"""
+
+
+class RedisLock:
+    """
+    Блокировка в Redis с TTL (SET NX PX).
+
+    Владелец должен продлевать её чаще, чем истекает ttl. Если процесс умер,
+    блокировка освобождается сама через ttl и её может взять другой процесс.
+    """
+
+    def __init__(self, redis_settings: RedisSettings, name: str, ttl: float):
+        self._redis_client = get_redis_client(redis_settings)
+        self._name = name
+        self._ttl_ms = int(ttl * 1000)
+        self._token = uuid.uuid4().hex
+        self._renew = self._redis_client.register_script(RENEW_SCRIPT)
+        self._release = self._redis_client.register_script(RELEASE_SCRIPT)
+
+    async def acquire(self) -> bool:
+        return bool(
+            await self._redis_client.set(self._name, self._token, nx=True, px=self._ttl_ms),
+        )
+
+    async def renew(self) -> bool:
+        """Продлевает блокировку; False - блокировка потеряна (истекла или перехвачена)."""
+        return bool(await self._renew(keys=[self._name], args=[self._token, self._ttl_ms]))
+
+    async def release(self) -> None:
+        await self._release(keys=[self._name], args=[self._token])
+
+
+class RedisSemaphore:
+    """
+    Семафор в Redis: ограничивает число одновременных операций во всех
+    процессах и репликах сразу, а не в каждом процессе отдельно.
+
+    Занятый слот живёт ttl секунд и продлевается, пока владелец его держит.
+    Слоты умершего процесса освобождаются сами по истечении ttl.
+    """
+
+    def __init__(
+        self,
+        redis_settings: RedisSettings,
+        name: str,
+        limit: int,
+        ttl: float,
+        poll_interval: float = 0.2,
+    ):
+        self._redis_client = get_redis_client(redis_settings)
+        self._name = name
+        self._limit = limit
+        self._ttl = ttl
+        self._poll_interval = poll_interval
+        self._acquire = self._redis_client.register_script(ACQUIRE_SLOT_SCRIPT)
+        self._renew = self._redis_client.register_script(RENEW_SLOT_SCRIPT)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        token = uuid.uuid4().hex
+        while not await self._acquire(keys=[self._name], args=[self._limit, self._ttl, token]):
+            await asyncio.sleep(self._poll_interval * random.uniform(0.5, 1.5))
+        keep_alive = asyncio.create_task(self._keep_alive(token))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            try:
+                await self._redis_client.zrem(self._name, token)
+            except Exception as e:
+                # Слот освободится сам по истечении ttl
+                logging.warning("Semaphore %s release error: %s", self._name, e)
+
+    async def _keep_alive(self, token: str) -> None:
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            try:
+                await self._renew(keys=[self._name], args=[self._ttl, token])
+            except Exception as e:
+                logging.warning("Semaphore %s renew error: %s", self._name, e)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import smtplib
+import uuid
+from functools import lru_cache
+
+from src.app.core.settings import SMTPSettings, get_redis_settings, get_smtp_settings
+from src.app.modules.queue import Delivery, ReliableQueue
+from src.app.utils.emails import SMTPConnectionPool, build_message
+
+
+class EmailOutbox:
+    """
+    Исходящая почта через очередь в Redis.
+
+    Обработчики запросов только кладут письмо в очередь и сразу отвечают.
+    Фоновые отправители забирают письма пачками и отправляют их через пул
+    постоянных SMTP-соединений. Временные ошибки повторяются с экспоненциальной
+    паузой, письма с постоянной ошибкой (ответ 5xx) уходят в dead-letter.
+    """
+
+    def __init__(self, queue: ReliableQueue, settings: SMTPSettings):
+        self._queue = queue
+        self._pool = SMTPConnectionPool(settings)
+        self._concurrency = settings.POOL_SIZE
+        self._batch_size = settings.OUTBOX_BATCH_SIZE
+        self._dequeue_timeout = settings.OUTBOX_DEQUEUE_TIMEOUT
+        self._requeue_interval = min(
+            settings.OUTBOX_RETRY_DELAY,
+            settings.OUTBOX_VISIBILITY_TIMEOUT / 3,
+        )
+
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        """Запуск отправителей (вызывать в startup)."""
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [
+                asyncio.create_task(self._consume(worker_id))
+                for worker_id in range(self._concurrency)
+            ]
+            self._tasks.append(asyncio.create_task(self._requeue_periodically()))
+            logging.info("Email outbox started with %s senders", self._concurrency)
+
+    async def stop(self) -> None:
+        """Корректная остановка (вызывать в shutdown)."""
+        self._stopping = True
+        if self._tasks:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            await self._pool.close()
+            logging.info("Email outbox stopped")
+
+    async def send(self, email_to: str, subject: str, html_content: str) -> str:
+        """Ставит письмо в очередь на отправку, возвращает его id."""
+        return (await self.send_many([(email_to, subject, html_content)]))[0]
+
+    async def send_many(self, messages: list[tuple[str, str, str]]) -> list[str]:
+        """Ставит пачку писем (email_to, subject, html_content) в очередь одним RPUSH."""
+        payloads = [
+            {
+                "id": uuid.uuid4().hex,
+                "email_to": email_to,
+                "subject": subject,
+                "html_content": html_content,
+            }
+            for email_to, subject, html_content in messages
+        ]
+        await self._queue.enqueue_many(payloads)
+        return [payload["id"] for payload in payloads]
+
+    async def stats(self) -> dict[str, int]:
+        return await self._queue.stats()
+
+    async def _consume(self, worker_id: int) -> None:
+        pending: list[Delivery] = []
+        try:
+            while not self._stopping:
+                try:
+                    if not pending:
+                        pending = await self._queue.dequeue_blocking(
+                            self._dequeue_timeout,
+                            self._batch_size,
+                        )
+                    while pending:
+                        await self._send(pending[0])
+                        pending.pop(0)
+                except Exception as e:
+                    logging.exception("Outbox sender %s error: %s", worker_id, e)
+                    await asyncio.sleep(3)
+        finally:
+            if pending:
+                await self._queue.requeue_front(pending)
+
+    async def _send(self, delivery: Delivery) -> None:
+        payload = json.loads(delivery.raw)
+        message = build_message(
+            email_to=payload["email_to"],
+            subject=payload["subject"],
+            html_content=payload["html_content"],
+        )
+        try:
+            await self._pool.send(message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+            if self._is_permanent(e):
+                logging.warning("Outbox message %s rejected: %s", payload["id"], e)
+                await self._queue.reject(delivery)
+            else:
+                logging.warning("Outbox message %s will be retried: %s", payload["id"], e)
+                await self._queue.fail(delivery)
+            return
+        except (OSError, smtplib.SMTPException) as e:
+            logging.warning("Outbox message %s will be retried: %s", payload["id"], e)
+            await self._queue.fail(delivery)
+            return
+        await self._queue.ack(delivery)
+        logging.info("Outbox message %s sent to %s", payload["id"], payload["email_to"])
+
+    @staticmethod
+    def _is_permanent(error: smtplib.SMTPRecipientsRefused | smtplib.SMTPResponseException) -> bool:
+        """
+        Постоянная ошибка - только 5xx. 4xx (421, греилистинг 450/451, переполненный
+        ящик 452) временные, даже если smtplib поднял их как отказ отправителя
+        или получателя.
+        """
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(500 <= code < 600 for code, _ in error.recipients.values())
+        return 500 <= error.smtp_code < 600
+
+    async def _requeue_periodically(self) -> None:
+        """
+        Продлевает аренды своих писем, возвращает в очередь письма упавших
+        отправителей и письма, ждавшие повтора.
+        """
+        while not self._stopping:
+            try:
+                await self._queue.extend_leases()
+                await self._queue.requeue_expired()
+                await self._queue.requeue_delayed()
+            except Exception as e:
+                logging.exception("Outbox requeue error: %s", e)
+            await asyncio.sleep(self._requeue_interval)
+
+
+@lru_cache(maxsize=1)
+def get_email_outbox() -> EmailOutbox:
+    settings = get_smtp_settings()
+    queue = ReliableQueue(
+        get_redis_settings(),
+        queue_name="email_outbox",
+        reliable=True,
+        visibility_timeout=settings.OUTBOX_VISIBILITY_TIMEOUT,
+        max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+        retry_delay=settings.OUTBOX_RETRY_DELAY,
+        retry_max_delay=settings.OUTBOX_RETRY_MAX_DELAY,
+    )
+    return EmailOutbox(queue, settings)
@@ -1,11 +1,38 @@
 import asyncio
+import datetime
+from collections.abc import Callable
+from email.utils import parsedate_to_datetime
 from functools import lru_cache
 import json
 import logging
 import httpx
+from pydantic import ValidationError
 
-from src.app.modules.queue import EmailQueue, get_email_queue
+from src.app.core.settings import (
+    EmailWorkerSettings,
+    get_email_worker_settings,
+    get_redis_settings,
+)
+from src.app.crud import preprocessed_email as preprocessed_email_crud
+from src.app.db.database import Session
+from src.app.db.models.preprocessed_email import PreprocessedEmail, PreprocessedEmailCreate
+from src.app.modules.dedup import get_email_deduplicator, is_pending
+from src.app.modules.queue import Delivery, EmailQueue, get_email_queue
 from src.app.modules.gigachat import get_gigachat
+from src.app.modules.locks import RedisSemaphore
+from src.app.modules.resilience import CircuitOpenError
+
+
+# Поля письма, которые уходят в GigaChat (служебные id в промпт не попадают)
+PROMPT_FIELDS = ("uid", "subject", "from_", "date", "body")
+
+
+class ExtractionError(ValueError):
+    """Ответ GigaChat не удалось привести к PreprocessedEmailCreate."""
+
+
+class OriginalPendingError(Exception):
+    """Письмо - дубль письма, которое ещё обрабатывается."""
 
 
 class EmailProcessingWorker:
@@ -13,12 +40,34 @@ class EmailProcessingWorker:
         self,
         redis_client: EmailQueue,
         queue_name: str = "email_queue",
+        settings: EmailWorkerSettings | None = None,
     ):
+        settings = settings or get_email_worker_settings()
         self._redis = redis_client
         self._gigachat = get_gigachat()
         self._queue_name = queue_name
+        self._dequeue_timeout = settings.DEQUEUE_TIMEOUT
+        self._concurrency = settings.CONCURRENCY
+        self._prefetch = settings.PREFETCH
+        self._reaper_interval = settings.VISIBILITY_TIMEOUT / 3
+        self._dedup = get_email_deduplicator() if settings.DEDUP_ENABLED else None
+        self._dedup_retry_delay = settings.DEDUP_RETRY_DELAY
+        # Ограничивает число одновременных запросов к GigaChat (квота) сразу
+        # для всех процессов uvicorn и реплик, а не для каждого процесса
+        self._gigachat_slots = RedisSemaphore(
+            get_redis_settings(),
+            "gigachat:in_flight",
+            settings.GIGACHAT_MAX_IN_FLIGHT,
+            settings.GIGACHAT_SLOT_TTL,
+        )
+        # Результаты копятся и пишутся в БД пачками; письмо подтверждается
+        # в очереди только после коммита своей пачки
+        self._result_batch_size = settings.RESULT_BATCH_SIZE
+        self._result_flush_interval = settings.RESULT_FLUSH_INTERVAL
+        self._results: list[tuple[Delivery, dict, PreprocessedEmail]] = []
+        self._flush_lock = asyncio.Lock()
 
-        self._task: asyncio.Task | None = None
+        self._tasks: list[asyncio.Task] = []
         self._stopping = False
         self._system_prompt = """
 Ты - модуль извлечения данных из писем техподдержки. Тебе дают ПОЛНЫЙ ТЕКСТ одного письма (тема + тело), без вложений.
@@ -115,56 +164,223 @@ class EmailProcessingWorker:
 """
 
     def start(self) -> None:
-        """Запуск воркера (вызывать в startup)."""
-        if self._task is None:
-            self._task = asyncio.create_task(self._run())
-            logging.info("Email worker started")
+        """Запуск воркеров (вызывать в startup)."""
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [
+                asyncio.create_task(self._consume(worker_id))
+                for worker_id in range(self._concurrency)
+            ]
+            self._tasks.append(asyncio.create_task(self._requeue_expired()))
+            self._tasks.append(asyncio.create_task(self._flush_periodically()))
+            logging.info("Email worker started with %s consumers", self._concurrency)
 
     async def stop(self) -> None:
         """Корректная остановка (вызывать в shutdown)."""
         self._stopping = True
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
+        if self._tasks:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            await self._flush_results()
             logging.info("Email worker stopped")
 
-    async def _run(self) -> None:
+    async def _consume(self, worker_id: int) -> None:
+        pending: list[Delivery] = []
+        try:
+            while not self._stopping:
+                try:
+                    # Спим на сокете до прихода письма; таймаут нужен,
+                    # чтобы периодически проверять флаг остановки.
+                    # Новые письма забираем только после обработки своих,
+                    # поэтому очередь не вычерпывается быстрее, чем позволяет квота
+                    if not pending:
+                        # Пока GigaChat недоступен, письма остаются в очереди
+                        await self._gigachat.wait_available()
+                        pending = await self._redis.dequeue_blocking(
+                            self._dequeue_timeout,
+                            self._prefetch,
+                        )
+                    while pending:
+                        delivery = pending[0]
+                        email_data = json.loads(delivery.raw)
+                        preprocessed_email = await self._process_email(email_data)
+                        if preprocessed_email is None:
+                            await self._redis.ack(delivery)
+                        else:
+                            await self._buffer_result(delivery, email_data, preprocessed_email)
+                        pending.pop(0)
+                except ExtractionError as e:
+                    logging.warning("Worker %s: %s", worker_id, e)
+                    await self._redis.reject(pending.pop(0))
+                except OriginalPendingError as e:
+                    # Если оригинал не сохранится, дубль обработается как новое письмо
+                    logging.info("Worker %s: %s, retrying later", worker_id, e)
+                    await self._redis.defer(pending.pop(0), self._dedup_retry_delay)
+                except CircuitOpenError as e:
+                    # Попытка не засчитывается: письма возвращаются в очередь
+                    # и ждут, пока GigaChat снова станет доступен
+                    logging.warning("Worker %s paused: GigaChat unavailable (%s)", worker_id, e)
+                    await self._redis.requeue_front(pending)
+                    pending = []
+                except Exception as e:
+                    logging.exception("Worker %s error: %s", worker_id, e)
+                    if pending:
+                        await self._fail(pending.pop(0))
+                    await asyncio.sleep(3)
+        finally:
+            if pending:
+                await self._redis.requeue_front(pending)
+
+    async def _fail(self, delivery: Delivery) -> None:
+        try:
+            await self._redis.fail(delivery)
+        except Exception as e:
+            # Письмо всё равно вернётся в очередь по истечении таймаута видимости
+            logging.warning("Failed to return email to queue: %s", e)
+
+    async def _requeue_expired(self) -> None:
+        """
+        Периодически продлевает аренды своих писем (в обработке и в буфере
+        результатов), возвращает в очередь письма упавших воркеров и отложенные
+        дубли, оригинал которых ещё обрабатывался.
+        """
         while not self._stopping:
             try:
-                result = await self._redis.dequeue_email()
-                if result is None:
-                    continue  # просто ждём дальше
-                _, raw_data = result
-                email_data = json.loads(raw_data)
-                await self._process_email(email_data)
-            except asyncio.CancelledError:
-                break
+                await self._redis.extend_leases()
+                if redelivered := await self._redis.requeue_expired():
+                    logging.warning("Redelivered %s expired emails", redelivered)
+                await self._redis.requeue_delayed()
+            except Exception as e:
+                logging.exception("Requeue error: %s", e)
+            await asyncio.sleep(self._reaper_interval)
+
+    async def _buffer_result(
+        self,
+        delivery: Delivery,
+        email_data: dict,
+        preprocessed_email: PreprocessedEmail,
+    ) -> None:
+        self._results.append((delivery, email_data, preprocessed_email))
+        if len(self._results) >= self._result_batch_size:
+            await self._flush_results()
 
+    async def _flush_periodically(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self._result_flush_interval)
+            try:
+                await self._flush_results()
+            except Exception as e:
+                # Ошибка Redis при ack/fail не должна останавливать сброс по таймеру:
+                # неподтверждённые письма вернутся в очередь по истечении аренды
+                logging.exception("Result flush error: %s", e)
+
+    async def _flush_results(self) -> None:
+        """Пишет накопленные результаты одной транзакцией и подтверждает письма."""
+        async with self._flush_lock:
+            batch, self._results = self._results, []
+            if not batch:
+                return
+            try:
+                async with Session() as session:
+                    inserted = await preprocessed_email_crud.create_preprocessed_emails(
+                        session,
+                        [preprocessed_email for _, _, preprocessed_email in batch],
+                    )
             except Exception as e:
-                logging.exception("Worker error: %s", e)
-                await asyncio.sleep(3)
+                logging.exception("Failed to save %s preprocessed emails: %s", len(batch), e)
+                for delivery, _, _ in batch:
+                    await self._fail(delivery)
+                return
+            for delivery, email_data, preprocessed_email in batch:
+                await self._redis.ack(delivery)
+                if self._dedup is not None and preprocessed_email.ingest_id in inserted:
+                    await self._dedup.link(
+                        email_data,
+                        str(inserted[preprocessed_email.ingest_id]),
+                    )
+            logging.info("Saved %s preprocessed emails", len(inserted))
+
+    async def _process_email(self, email_data: dict) -> PreprocessedEmail | None:
+        if self._dedup is not None:
+            if original := await self._dedup.claim(email_data):
+                if is_pending(original):
+                    raise OriginalPendingError(
+                        f"Email UID {email_data.get('uid')} is a duplicate of {original}",
+                    )
+                logging.info(
+                    "Email UID %s is a duplicate of %s, skipping extraction",
+                    email_data.get("uid"),
+                    original,
+                )
+                return None
+            try:
+                return await self._extract(email_data)
+            except Exception:
+                await self._dedup.release(email_data)
+                raise
+        return await self._extract(email_data)
 
-    async def _process_email(self, email_data: dict) -> dict:
-        parsed = await self._parse_to_dto(str(email_data))
+    async def _extract(self, email_data: dict) -> PreprocessedEmail:
+        text = str({key: email_data.get(key) for key in PROMPT_FIELDS})
+        parsed = await self._parse_to_dto(text, email_data)
 
         logging.info(
             "Email UID %s processed. Parsed result: %s",
             email_data.get("uid"),
             parsed,
         )
-        return parsed
+        # Через model_dump, чтобы применились сериализаторы PreprocessedEmailCreate
+        # (email в нижнем регистре)
+        return PreprocessedEmail.model_validate(
+            parsed.model_dump(),
+            update={"ingest_id": email_data.get("ingest_id")},
+        )
+
+    async def _parse_to_dto(self, text: str, email_data: dict) -> PreprocessedEmailCreate:
+        # Ответ попадает в кэш GigaChat, только если он разбирается
+        response = await self._call_gigachat(
+            text, validate=lambda r: self._parse_response(r, email_data),
+        )
+        return self._parse_response(response, email_data)
+
+    def _parse_response(self, response: str, email_data: dict) -> PreprocessedEmailCreate:
+        content = response.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+        try:
+            data = json.loads(content)
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+            return PreprocessedEmailCreate.model_validate(
+                self._apply_fallbacks(data, email_data),
+            )
+        except (ValueError, ValidationError) as e:
+            raise ExtractionError(
+                f"Email UID {email_data.get('uid')}: invalid extraction result: {e}",
+            )
 
-    async def _parse_to_dto(self, text: str) -> dict:
-        response = await self._call_gigachat(text)
-        return response
+    @staticmethod
+    def _apply_fallbacks(data: dict, email_data: dict) -> dict:
+        """Заполняет обязательные поля, которые GigaChat вернул как null."""
+        if not data.get("date"):
+            try:
+                data["date"] = parsedate_to_datetime(email_data.get("date", "")).date()
+            except (TypeError, ValueError):
+                data["date"] = datetime.date.today()
+        data["email"] = data.get("email") or email_data.get("from_")
+        data["emotional_color"] = data.get("emotional_color") or "neutral"
+        data["question"] = data.get("question") or email_data.get("subject") or ""
+        data["short_question"] = data.get("short_question") or data["question"][:120]
+        return data
 
-    async def _call_gigachat(self, text: str) -> dict:
-        return await self._gigachat.chat(
-           prompt=self._system_prompt + '\n\n' + text,
-       )
+    async def _call_gigachat(
+        self, text: str, validate: Callable[[str], object] | None = None,
+    ) -> str:
+        async with self._gigachat_slots.slot():
+            return await self._gigachat.chat(
+               prompt=self._system_prompt + '\n\n' + text,
+               validate=validate,
+           )
 
 @lru_cache(maxsize=1)
 def get_email_processor() -> EmailProcessingWorker:
@@ -1,42 +1,403 @@
+from dataclasses import dataclass
 from functools import lru_cache
 import os
-import redis.asyncio as redis
+import random
+import time
+import uuid
 import json
 
-from src.app.core.settings import RedisSettings, get_redis_settings
+from src.app.core.settings import RedisSettings, get_email_worker_settings, get_redis_settings
+from src.app.db.redis import get_redis_client
 
-class EmailQueue:
-    def __init__(self, redis_settings: RedisSettings, queue_name: str):
-        self._redis_client = redis.Redis(
-            host=redis_settings.HOST,
-            port=redis_settings.PORT,
-            db=redis_settings.DB,
-            encoding="utf-8",
-            decode_responses=True
-        )
+# Выдача писем в обработку: перенос из очереди в хеш выдач и аренда
+# по токену выдачи выполняются одной атомарной операцией
+RESERVE_SCRIPT = """
+local reserved = {}
+for i = 2, #ARGV do
+    local raw_email = redis.call('lpop', KEYS[1])
+    if not raw_email then
+        break
+    end
+    redis.call('hset', KEYS[2], ARGV[i], raw_email)
+    redis.call('zadd', KEYS[3], ARGV[1], ARGV[i])
+    table.insert(reserved, ARGV[i])
+    table.insert(reserved, raw_email)
+end
+return reserved
+"""
+
+# Повторная выдача после неудачи или истечения аренды. Срабатывает, только если
+# аренда ещё принадлежит этой выдаче, поэтому чужая (новая) выдача не задевается
+REDELIVER_SCRIPT = """
+if redis.call('zrem', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+local raw_email = redis.call('hget', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+if not raw_email then
+    return 0
+end
+local attempt_key = redis.sha1hex(raw_email)
+local attempts = redis.call('hincrby', KEYS[4], attempt_key, 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('rpush', KEYS[5], raw_email)
+    redis.call('hdel', KEYS[4], attempt_key)
+    redis.call('hincrby', KEYS[7], 'dead_lettered', 1)
+    return 1
+end
+local retry_delay = tonumber(ARGV[3])
+if retry_delay > 0 then
+    local delay = math.min(tonumber(ARGV[4]), retry_delay * 2 ^ (attempts - 1))
+    redis.call('zadd', KEYS[6], tonumber(ARGV[5]) + delay * tonumber(ARGV[6]), raw_email)
+else
+    redis.call('rpush', KEYS[1], raw_email)
+end
+redis.call('hincrby', KEYS[7], 'redelivered', 1)
+return 1
+"""
+
+# Возврат своих выдач в начало очереди без засчитывания попытки
+RELEASE_SCRIPT = """
+for i = #ARGV, 1, -1 do
+    if redis.call('zrem', KEYS[3], ARGV[i]) == 1 then
+        local raw_email = redis.call('hget', KEYS[2], ARGV[i])
+        redis.call('hdel', KEYS[2], ARGV[i])
+        if raw_email then
+            redis.call('lpush', KEYS[1], raw_email)
+        end
+    end
+end
+return 0
+"""
+
+# Перенос в dead-letter, только если аренда ещё принадлежит этой выдаче
+REJECT_SCRIPT = """
+if redis.call('zrem', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+local raw_email = redis.call('hget', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+if raw_email then
+    redis.call('hdel', KEYS[4], redis.sha1hex(raw_email))
+    redis.call('rpush', KEYS[5], raw_email)
+    redis.call('hincrby', KEYS[7], 'dead_lettered', 1)
+end
+return 1
+"""
+
+# Подтверждение, только если аренда ещё принадлежит этой выдаче: запоздавший
+# ack после повторной выдачи не трогает новую выдачу и не портит статистику
+ACK_SCRIPT = """
+if redis.call('zrem', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+local raw_email = redis.call('hget', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+if raw_email then
+    redis.call('hdel', KEYS[4], redis.sha1hex(raw_email))
+end
+redis.call('hincrby', KEYS[7], 'acked', 1)
+redis.call('hset', KEYS[7], 'last_ack_at', ARGV[2])
+return 1
+"""
+
+# Отложенный повтор без засчитывания попытки, только для своей выдачи
+DEFER_SCRIPT = """
+if redis.call('zrem', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+local raw_email = redis.call('hget', KEYS[2], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+if raw_email then
+    redis.call('zadd', KEYS[6], ARGV[2], raw_email)
+end
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class Delivery:
+    """Одна выдача из очереди: токен аренды и сырые данные элемента."""
+    token: str
+    raw: str
+
+
+class ReliableQueue:
+    """
+    Очередь JSON-задач в Redis: входящие письма, исходящая почта, выгрузки.
+
+    В надёжном режиме (reliable=True) задача при извлечении не удаляется,
+    а атомарно переносится в хеш выдач под новым токеном с дедлайном
+    видимости (аренда). Все дальнейшие операции (ack, fail, reject) адресуются
+    по токену выдачи: если аренда истекла и задача уже выдана другому воркеру,
+    запоздавший ack или fail первого воркера не трогает новую выдачу.
+    Пока задача обрабатывается, аренды продлеваются через extend_leases().
+    После успешной обработки задача подтверждается через ack(). Если воркер
+    упал или не продлил аренду, задача возвращается в очередь,
+    а после max_attempts попыток уходит в dead-letter список.
+    При retry_delay > 0 неудачная задача возвращается не сразу, а через
+    экспоненциально растущую паузу со случайным разбросом (список отложенных).
+    """
+
+    def __init__(
+        self,
+        redis_settings: RedisSettings,
+        queue_name: str,
+        *,
+        reliable: bool = False,
+        visibility_timeout: float = 120,
+        max_attempts: int = 3,
+        retry_delay: float = 0,
+        retry_max_delay: float = 300,
+    ):
+        self._redis_client = get_redis_client(redis_settings)
         self._queue_name = queue_name
-    
+        self._reliable = reliable
+        self._visibility_timeout = visibility_timeout
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._retry_max_delay = retry_max_delay
+        self._deliveries_name = f"{queue_name}:deliveries"
+        self._leases_name = f"{queue_name}:leases"
+        self._attempts_name = f"{queue_name}:attempts"
+        self._dead_letter_name = f"{queue_name}:dead"
+        self._delayed_name = f"{queue_name}:delayed"
+        self._stats_name = f"{queue_name}:stats"
+        # Ключи в порядке KEYS[1..7] Lua-скриптов
+        self._script_keys = [
+            self._queue_name,
+            self._deliveries_name,
+            self._leases_name,
+            self._attempts_name,
+            self._dead_letter_name,
+            self._delayed_name,
+            self._stats_name,
+        ]
+        self._reserve = self._redis_client.register_script(RESERVE_SCRIPT)
+        self._redeliver = self._redis_client.register_script(REDELIVER_SCRIPT)
+        self._release = self._redis_client.register_script(RELEASE_SCRIPT)
+        self._reject = self._redis_client.register_script(REJECT_SCRIPT)
+        self._ack = self._redis_client.register_script(ACK_SCRIPT)
+        self._defer = self._redis_client.register_script(DEFER_SCRIPT)
+        # Токены выдач этого процесса, аренды которых продлевает extend_leases()
+        self._leased: set[str] = set()
+
     @property
     async def is_empty(self) -> bool:
         length = await self._redis_client.llen(self._queue_name)
         return length == 0
 
-    async def enqueue_email(self, email_data: dict):
-        await self._redis_client.rpush(self._queue_name, json.dumps(email_data))
+    async def enqueue(self, item: dict):
+        await self._redis_client.rpush(self._queue_name, json.dumps(item))
+
+    async def enqueue_many(self, items: list[dict]):
+        """Кладёт пачку задач в очередь одним RPUSH."""
+        if items:
+            await self._redis_client.rpush(
+                self._queue_name,
+                *(json.dumps(item) for item in items),
+            )
 
-    async def dequeue_email(self):
+    async def dequeue(self):
         data = await self._redis_client.lpop(self._queue_name)
         if data:
             return json.loads(data)
         return None
 
+    async def dequeue_one_blocking(self, timeout: float) -> tuple[str, str] | None:
+        """
+        Блокирующее извлечение одной задачи (BLPOP).
+        Возвращает пару (имя очереди, сырые данные) или None по таймауту.
+        """
+        return await self._redis_client.blpop([self._queue_name], timeout=timeout)
+
+    async def dequeue_blocking(self, timeout: float, count: int = 1) -> list[Delivery]:
+        """
+        Ждёт первую задачу и забирает ещё до count - 1 задач без ожидания (prefetch).
+        """
+        if self._reliable:
+            return await self._reserve_batch(timeout, count)
+        result = await self.dequeue_one_blocking(timeout)
+        if result is None:
+            return []
+        _, first = result
+        rest = await self._redis_client.lpop(self._queue_name, count - 1) if count > 1 else None
+        return [Delivery("", raw_email) for raw_email in [first, *(rest or [])]]
+
+    async def requeue_front(self, deliveries: list[Delivery]):
+        """Возвращает необработанные задачи в начало очереди в исходном порядке."""
+        if not deliveries:
+            return
+        if not self._reliable:
+            await self._redis_client.lpush(
+                self._queue_name, *reversed([delivery.raw for delivery in deliveries]),
+            )
+            return
+        tokens = [delivery.token for delivery in deliveries]
+        await self._release(keys=self._script_keys, args=tokens)
+        self._leased.difference_update(tokens)
+
+    async def ack(self, delivery: Delivery):
+        """Подтверждает успешную обработку задачи."""
+        if not self._reliable:
+            return
+        self._leased.discard(delivery.token)
+        await self._ack(keys=self._script_keys, args=[delivery.token, time.time()])
+
+    async def fail(self, delivery: Delivery):
+        """
+        Отмечает неудачную попытку обработки: задача возвращается в очередь
+        или, если попытки исчерпаны, уходит в dead-letter список.
+        """
+        if not self._reliable:
+            return
+        self._leased.discard(delivery.token)
+        await self._redeliver_token(delivery.token)
+
+    async def reject(self, delivery: Delivery):
+        """Сразу переносит задачу в dead-letter список (повтор бесполезен)."""
+        if not self._reliable:
+            return
+        self._leased.discard(delivery.token)
+        await self._reject(keys=self._script_keys, args=[delivery.token])
+
+    async def defer(self, delivery: Delivery, delay: float):
+        """
+        Возвращает задачу в очередь через delay секунд, не засчитывая попытку
+        (задачу пока нельзя обработать, но ошибки нет). Повтор делает requeue_delayed().
+        """
+        due = time.time() + delay
+        if not self._reliable:
+            await self._redis_client.zadd(self._delayed_name, {delivery.raw: due})
+            return
+        self._leased.discard(delivery.token)
+        await self._defer(keys=self._script_keys, args=[delivery.token, due])
+
+    async def extend_leases(self) -> int:
+        """
+        Продлевает аренды задач, которые этот процесс ещё обрабатывает.
+        Вызывать чаще, чем истекает visibility_timeout. Истёкшие аренды
+        не восстанавливаются (ZADD XX): такие задачи уже выданы заново.
+        """
+        if not self._reliable or not self._leased:
+            return 0
+        deadline = time.time() + self._visibility_timeout
+        return await self._redis_client.zadd(
+            self._leases_name,
+            dict.fromkeys(self._leased, deadline),
+            xx=True,
+            ch=True,
+        )
+
+    async def requeue_expired(self) -> int:
+        """
+        Возвращает в очередь задачи, у которых истёк таймаут видимости.
+        Безопасно вызывать из нескольких воркеров: выдачу забирает тот,
+        чей ZREM удалил её из списка аренд.
+        """
+        if not self._reliable:
+            return 0
+        expired = await self._redis_client.zrangebyscore(
+            self._leases_name, "-inf", time.time(),
+        )
+        redelivered = 0
+        for token in expired:
+            redelivered += await self._redeliver_token(token)
+        return redelivered
+
+    async def requeue_delayed(self) -> int:
+        """Возвращает в очередь отложенные задачи, у которых подошло время повтора."""
+        due = await self._redis_client.zrangebyscore(
+            self._delayed_name, "-inf", time.time(),
+        )
+        requeued = 0
+        for raw_email in due:
+            if await self._redis_client.zrem(self._delayed_name, raw_email):
+                await self._redis_client.rpush(self._queue_name, raw_email)
+                requeued += 1
+        return requeued
+
+    async def stats(self) -> dict[str, int]:
+        async with self._redis_client.pipeline(transaction=False) as pipe:
+            pipe.llen(self._queue_name)
+            pipe.hlen(self._deliveries_name)
+            pipe.zcard(self._delayed_name)
+            pipe.llen(self._dead_letter_name)
+            pipe.hgetall(self._stats_name)
+            queued, processing, delayed, dead, counters = await pipe.execute()
+        return {
+            "queued": queued,
+            "processing": processing,
+            "delayed": delayed,
+            "dead": dead,
+            "acked": int(counters.get("acked", 0)),
+            "redelivered": int(counters.get("redelivered", 0)),
+            "dead_lettered": int(counters.get("dead_lettered", 0)),
+            "last_ack_at": float(counters["last_ack_at"]) if "last_ack_at" in counters else None,
+        }
+
+    async def _reserve_batch(self, timeout: float, count: int) -> list[Delivery]:
+        deadline = time.monotonic() + timeout
+        while True:
+            tokens = [uuid.uuid4().hex for _ in range(count)]
+            reserved = await self._reserve(
+                keys=self._script_keys,
+                args=[time.time() + self._visibility_timeout, *tokens],
+            )
+            if reserved:
+                deliveries = [
+                    Delivery(token, raw_email)
+                    for token, raw_email in zip(reserved[::2], reserved[1::2], strict=True)
+                ]
+                self._leased.update(delivery.token for delivery in deliveries)
+                return deliveries
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            # Ждём задачу на сокете, не забирая её: LEFT -> LEFT в ту же очередь
+            # оставляет задачу на месте, а выдаёт его атомарный скрипт выше
+            if await self._redis_client.blmove(
+                self._queue_name, self._queue_name, remaining, "LEFT", "LEFT",
+            ) is None:
+                return []
+
+    async def _redeliver_token(self, token: str) -> int:
+        return await self._redeliver(
+            keys=self._script_keys,
+            args=[
+                token,
+                self._max_attempts,
+                self._retry_delay,
+                self._retry_max_delay,
+                time.time(),
+                random.uniform(0.5, 1),
+            ],
+        )
+
+    async def ping(self) -> bool:
+        return await self._redis_client.ping()
+
     async def set(self, key: str, value):
         await self._redis_client.set(key, value)
 
     async def get(self, key: str):
         return await self._redis_client.get(key)
 
+
+# Прежнее имя: очередь входящих писем - частный случай ReliableQueue
+EmailQueue = ReliableQueue
+
+
 @lru_cache(maxsize=1)
 def get_email_queue() -> EmailQueue:
     redis_settings = get_redis_settings()
-    return EmailQueue(redis_settings, queue_name="email_queue")
+    worker_settings = get_email_worker_settings()
+    return EmailQueue(
+        redis_settings,
+        queue_name="email_queue",
+        reliable=worker_settings.RELIABLE_QUEUE,
+        visibility_timeout=worker_settings.VISIBILITY_TIMEOUT,
+        max_attempts=worker_settings.MAX_ATTEMPTS,
+        retry_delay=worker_settings.RETRY_DELAY,
+        retry_max_delay=worker_settings.RETRY_MAX_DELAY,
+    )
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from src.app.core.settings import RedisSettings
+from src.app.db.redis import get_redis_client
+
+# Резервирование токена: ведро может уйти в минус, тогда ответ - сколько
+# секунд ждать до своей очереди. Время берётся у Redis, а не у хостов
+TAKE_TOKEN_SCRIPT = """
+local now = redis.call('time')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate) - 1
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('expire', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов, общий для всех процессов и реплик.
+
+    Ведро на capacity токенов в Redis пополняется со скоростью rate токенов
+    в секунду. Каждый запрос резервирует токен; если ведро пустое, acquire()
+    ждёт, пока подойдёт его очередь. Так суммарная частота запросов всех
+    процессов не превышает квоту сервиса (429), а всплески растягиваются во времени.
+    """
+
+    def __init__(self, redis_settings: RedisSettings, name: str, rate: float, capacity: int):
+        self._redis_client = get_redis_client(redis_settings)
+        self._name = name
+        self._rate = rate
+        self._capacity = capacity
+        self._take = self._redis_client.register_script(TAKE_TOKEN_SCRIPT)
+
+    async def acquire(self) -> None:
+        delay = float(
+            await self._take(keys=[self._name], args=[self._rate, self._capacity]),
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitOpenError(Exception):
+    """Предохранитель разомкнут: сервис недоступен, запрос не отправлялся."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit is open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего сервиса.
+
+    После failure_threshold неудач подряд размыкается на reset_timeout секунд:
+    запросы сразу получают CircuitOpenError, не нагружая лежащий сервис.
+    По истечении паузы пропускается один пробный запрос (half-open): успех
+    замыкает предохранитель, неудача размыкает его снова.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probing = False
+        self._probe_started_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._opened_until == 0:
+            return "closed"
+        now = time.monotonic()
+        # Пробный запрос, который так и не завершился (отмена), не блокирует навсегда
+        probing = self._probing and now - self._probe_started_at < self._reset_timeout
+        if now < self._opened_until or probing:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до пробного запроса (0, если запросы разрешены)."""
+        if self._opened_until == 0:
+            return 0.0
+        return max(0.0, self._opened_until - time.monotonic())
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(self.retry_after() or self._reset_timeout)
+        if state == "half_open":
+            self._probing = True
+            self._probe_started_at = time.monotonic()
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            self.trip(self._reset_timeout)
+
+    def trip(self, timeout: float) -> None:
+        """Размыкает предохранитель на timeout секунд (например, по длинному Retry-After)."""
+        self._opened_until = max(self._opened_until, time.monotonic() + timeout)
+        self._probing = False
+
+    async def wait_closed(self) -> None:
+        """Ждёт, пока предохранитель разрешит пробный запрос."""
+        while (delay := self.retry_after()) > 0 or self.state == "open":
+            await asyncio.sleep(delay or 1)
@@ -8,3 +8,5 @@ scheduler.add_job(check_new_emails, "interval", minutes=5)
 
 # Для запуска в приложении:
 # scheduler.start()
+# Основной путь доставки писем - MailboxListener (modules/listener.py),
+# периодический опрос нужен только как резервный вариант
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import uuid
+from functools import lru_cache
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.app.core.settings import RedisSettings, get_project_settings, get_redis_settings
+from src.app.db.models.user import User
+from src.app.db.redis import get_redis_client
+from src.app.modules.cache import Cache, InMemoryCache, RedisCache, TieredCache
+
+INVALIDATION_CHANNEL = "user_cache:invalidate"
+
+# Хеш пароля не кэшируется (и не копируется в общий Redis): он нужен только
+# при входе, а вход читает пользователя из БД
+EXCLUDED_FIELDS = {"hashed_password"}
+
+
+class UserCache:
+    """
+    Короткоживущий кэш пользователей по id для get_current_user.
+
+    Хранится снимок строки users без хеша пароля; при попадании из него
+    собирается объект User и присоединяется к сессии запроса через
+    merge(load=False), без запроса в БД. Поэтому с ним можно работать как
+    с загруженным (обновлять, удалять). crud.user сбрасывает запись при
+    изменении пользователя и рассылает сброс через Redis pub/sub остальным
+    процессам (start() подписывает процесс). Если подписка обрывалась,
+    кэш процесса очищается целиком; TTL остаётся последней границей устаревания.
+    """
+
+    def __init__(self, redis_settings: RedisSettings, local: InMemoryCache, shared: Cache | None):
+        self._redis_client = get_redis_client(redis_settings)
+        self._local = local
+        self._cache = TieredCache(*(tier for tier in (local, shared) if tier is not None))
+
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        """Подписка на сбросы из других процессов (вызывать в startup)."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Корректная остановка (вызывать в shutdown)."""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def get(self, session: AsyncSession, user_id: uuid.UUID | str) -> User | None:
+        if (data := await self._cache.get(str(user_id))) is not None:
+            user = User.model_validate({**json.loads(data), "hashed_password": ""})
+            make_transient_to_detached(user)
+            user = await session.merge(user, load=False)
+            # Заглушка хеша не должна быть видна: атрибут помечается незагруженным
+            session.expire(user, list(EXCLUDED_FIELDS))
+            return user
+        if (user := await session.get(User, user_id)) is not None:
+            await self._cache.set(str(user_id), user.model_dump_json(exclude=EXCLUDED_FIELDS))
+        return user
+
+    async def invalidate(self, user_id: uuid.UUID) -> None:
+        await self._cache.delete(str(user_id))
+        try:
+            await self._redis_client.publish(INVALIDATION_CHANNEL, str(user_id))
+        except Exception as e:
+            logging.warning("User cache invalidation publish error: %s", e)
+
+    async def _listen(self) -> None:
+        while not self._stopping:
+            try:
+                async with self._redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Сбросы, пришедшие до (пере)подключения, потеряны
+                    self._local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self._local.delete(message["data"])
+            except Exception as e:
+                logging.warning("User cache invalidation listener error: %s", e)
+                await asyncio.sleep(3)
+
+
+@lru_cache(maxsize=1)
+def get_user_cache() -> UserCache | None:
+    settings = get_project_settings()
+    if not settings.USER_CACHE_ENABLED:
+        return None
+    shared = None
+    if settings.USER_CACHE_REDIS:
+        shared = RedisCache(get_redis_settings(), settings.USER_CACHE_TTL, prefix="user_cache")
+    return UserCache(
+        get_redis_settings(),
+        InMemoryCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL),
+        shared,
+    )
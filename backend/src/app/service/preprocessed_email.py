@@ -1,18 +1,70 @@
-from io import BytesIO, StringIO
-from typing import Any, Sequence
-from fastapi.responses import StreamingResponse
+import asyncio
+import codecs
+import csv
+import importlib.util
+import tempfile
+import uuid
+from collections.abc import AsyncIterator
+from io import StringIO
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, BinaryIO, Sequence
+from fastapi import HTTPException
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.core.settings import get_project_settings
-from src.app.db.models.preprocessed_email import PreprocessedEmail, PreprocessedEmailCreate, PreprocessedEmailPublic, PreprocessedEmailsPublic
+from src.app.db.database import Session
+from src.app.db.models.export_job import ExportFormat
+from src.app.db.models.preprocessed_email import (
+    PreprocessedEmail,
+    PreprocessedEmailAnswer,
+    PreprocessedEmailCreate,
+    PreprocessedEmailFilter,
+    PreprocessedEmailPublic,
+    PreprocessedEmailsPublic,
+)
+from src.app.crud import counts as counts_crud
 from src.app.crud import preprocessed_email as preprocessed_email_crud
+from src.app.modules.counts import get_count_cache
 
-import pandas as pd
+from src.app.modules.outbox import get_email_outbox
+from src.app.utils.pagination import decode_cursor, encode_cursor
 
-from src.app.utils.emails import send_email
+# openpyxl и pyarrow тяжёлые и нужны только выгрузкам, поэтому импортируются
+# при первом использовании, а не при старте приложения
+if TYPE_CHECKING:
+    from openpyxl.worksheet._write_only import WriteOnlyWorksheet
 
 project_settings = get_project_settings()
 
+EXPORT_COLUMNS = [
+    "id",
+    "date",
+    "fio",
+    "object",
+    "object_number",
+    "object_type",
+    "phone_number",
+    "email",
+    "emotional_color",
+    "question",
+    "short_question",
+]
+
+# Размер куска при отдаче готового файла выгрузки
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Форматы на pyarrow; колонки с малым числом значений пишутся словарём
+COLUMNAR_FORMATS = ("parquet", "arrow")
+CATEGORICAL_COLUMNS = ("object_type", "emotional_color")
+
 rename_map = {
     "id": "ID",
     "date": "Дата",
@@ -39,13 +91,56 @@ async def get_preprocessed_emails(
     session: AsyncSession,
     skip: int = 0,
     limit: int = project_settings.DEFAULT_QUERY_LIMIT,
+    *,
+    cursor: str | None = None,
+    filters: PreprocessedEmailFilter | None = None,
+    exact_count: bool = False,
 ) -> PreprocessedEmailsPublic:
-    emails = await preprocessed_email_crud.get_preprocessed_emails(session, skip, limit)
+    filters = filters or PreprocessedEmailFilter()
+    cursor_scope = {
+        "sort_by": filters.sort_by,
+        "order": filters.order,
+        "filters": filters.model_dump(mode="json", exclude={"sort_by", "order"}),
+    }
+    emails = await preprocessed_email_crud.get_preprocessed_emails(
+        session,
+        skip,
+        limit,
+        after=decode_cursor(cursor, **cursor_scope) if cursor else None,
+        filters=filters,
+    )
+    next_cursor = None
+    if len(emails) == limit:
+        last = emails[-1]
+        next_cursor = encode_cursor(getattr(last, filters.sort_by), last.id, **cursor_scope)
+    count, count_is_estimate = await _count_preprocessed_emails(session, filters, exact_count)
     return PreprocessedEmailsPublic(
         data=[PreprocessedEmailPublic.model_validate(email) for email in emails],
-        count=len(emails),
+        count=count,
+        count_is_estimate=count_is_estimate,
+        next_cursor=next_cursor,
     )
 
+async def _count_preprocessed_emails(
+    session: AsyncSession,
+    filters: PreprocessedEmailFilter,
+    exact_count: bool,
+) -> tuple[int, bool]:
+    """
+    Общее число писем: для списка без фильтров - оценка планировщика,
+    иначе точный COUNT(*), закэшированный до следующей вставки.
+    """
+    if not exact_count and not preprocessed_email_crud.has_conditions(filters):
+        estimate = await counts_crud.estimate_count(session, PreprocessedEmail.__tablename__)
+        if estimate is not None:
+            return estimate, True
+    count = await get_count_cache().get_or_count(
+        PreprocessedEmail.__tablename__,
+        filters.model_dump(mode="json", exclude={"sort_by", "order"}),
+        lambda: preprocessed_email_crud.count_preprocessed_emails(session, filters),
+    )
+    return count, False
+
 async def create_preprocessed_email(
     session: AsyncSession,
     preprocessed_email_create: PreprocessedEmailCreate,
@@ -56,59 +151,259 @@ async def create_preprocessed_email(
     )
     return PreprocessedEmailPublic.model_validate(email)
 
-async def get_preprocessed_emails_csv_stream(
-    session: AsyncSession,
+async def iter_preprocessed_emails_csv(
     skip: int = 0,
-    limit: int = project_settings.DEFAULT_QUERY_LIMIT,
-) -> StringIO:
-    if not (emails := await preprocessed_email_crud.get_preprocessed_emails(session, skip, limit)):
-        output = BytesIO()
-        output.write(b"No data")
-        output.seek(0)
-        return output
-    df = _prepare_dataframe(emails)
-    stream = StringIO()
-    df.to_csv(stream, index=False, encoding="utf-8-sig")
-    stream.seek(0)
-    return stream
-
-def _prepare_dataframe(emails: Sequence[PreprocessedEmail]) -> pd.DataFrame:
-    return pd.DataFrame(
-        [
-            data.model_dump() for data in emails
-        ]
-    ).rename(
-        columns=rename_map,
-    )
+    limit: int | None = None,
+    filters: PreprocessedEmailFilter | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка CSV: строки читаются серверным курсором пачками
+    и сразу отдаются клиенту, память не растёт с размером выгрузки.
+    Сессия открывается здесь, т.к. генератор живёт дольше обработчика запроса.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(rename_map[column] for column in EXPORT_COLUMNS)
+    yield codecs.BOM_UTF8 + _drain(buffer).encode()
+    async with Session() as session:
+        async for rows in preprocessed_email_crud.stream_preprocessed_email_rows(
+            session,
+            EXPORT_COLUMNS,
+            skip=skip,
+            limit=_export_limit(limit),
+            filters=filters,
+        ):
+            writer.writerows(rows)
+            yield _drain(buffer).encode()
 
-async def get_preprocessed_emails_xlsx_stream(
-    session: AsyncSession,
+def _export_limit(limit: int | None) -> int:
+    """Выгрузка без limit или с большим limit ограничивается EXPORT_MAX_ROWS."""
+    if limit is None:
+        return project_settings.EXPORT_MAX_ROWS
+    return min(limit, project_settings.EXPORT_MAX_ROWS)
+
+def _drain(buffer: StringIO) -> str:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+async def iter_preprocessed_emails_file(
+    format: ExportFormat,
     skip: int = 0,
-    limit: int = project_settings.DEFAULT_QUERY_LIMIT,
-) -> BytesIO:
-    if not (emails := await preprocessed_email_crud.get_preprocessed_emails(session, skip, limit)):
-        output = BytesIO()
-        output.write(b"No data")
+    limit: int | None = None,
+    filters: PreprocessedEmailFilter | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка форматов, которые нельзя отдавать по мере записи
+    (XLSX, Parquet, Arrow): файл пишется пачками во временный файл на диске,
+    затем отдаётся кусками. Запись и чтение файла выполняются в потоке,
+    чтобы не блокировать event loop.
+    """
+    with tempfile.TemporaryFile() as output:
+        await write_preprocessed_emails_export(output, format, skip, limit, filters)
         output.seek(0)
-        return output
-    df = _prepare_dataframe(emails)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(
-            writer,
-            index=False,
-            sheet_name="Emails",
+        while chunk := await asyncio.to_thread(output.read, EXPORT_CHUNK_SIZE):
+            yield chunk
+
+async def write_preprocessed_emails_export(
+    output: BinaryIO,
+    format: ExportFormat,
+    skip: int = 0,
+    limit: int | None = None,
+    filters: PreprocessedEmailFilter | None = None,
+):
+    """Пишет выгрузку в открытый бинарный файл."""
+    if format == "xlsx":
+        await _write_xlsx(output, skip, limit, filters)
+    elif format in COLUMNAR_FORMATS:
+        await _write_columnar(output, format, skip, limit, filters)
+    else:
+        async for chunk in iter_preprocessed_emails_csv(skip, limit, filters):
+            await asyncio.to_thread(output.write, chunk)
+
+def ensure_export_backend(format: ExportFormat):
+    """Parquet и Arrow требуют pyarrow - опциональную зависимость (extra analytics)."""
+    if format in COLUMNAR_FORMATS and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_IMPLEMENTED,
+            detail=f"Export format {format} requires pyarrow (install backend[analytics])",
+        )
+
+async def _write_xlsx(
+    output: BinaryIO,
+    skip: int,
+    limit: int | None,
+    filters: PreprocessedEmailFilter | None,
+):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Emails")
+    sheet.append([rename_map[column] for column in EXPORT_COLUMNS])
+    async with Session() as session:
+        async for rows in preprocessed_email_crud.stream_preprocessed_email_rows(
+            session,
+            EXPORT_COLUMNS,
+            skip=skip,
+            limit=_export_limit(limit),
+            filters=filters,
+        ):
+            await asyncio.to_thread(_append_xlsx_rows, sheet, rows)
+    await asyncio.to_thread(workbook.save, output)
+
+def _append_xlsx_rows(sheet: "WriteOnlyWorksheet", rows: Sequence[Row]):
+    for row in rows:
+        # openpyxl не умеет писать UUID
+        sheet.append([str(value) if isinstance(value, uuid.UUID) else value for value in row])
+
+async def _write_columnar(
+    output: BinaryIO,
+    format: ExportFormat,
+    skip: int,
+    limit: int | None,
+    filters: PreprocessedEmailFilter | None,
+):
+    """
+    Parquet / Arrow IPC. Пачки из курсора копятся до EXPORT_ROW_GROUP_SIZE строк
+    и пишутся одной row group (для Arrow - серией record batch).
+    """
+    writer = await asyncio.to_thread(_open_columnar_writer, output, format)
+    batches = []
+    rows_in_group = 0
+    try:
+        async with Session() as session:
+            # Словари категорий берутся по всей таблице, чтобы у всех выгрузок
+            # был одинаковый набор категорий и в файле был один словарь на колонку
+            encoders = {
+                column: _CategoryEncoder(
+                    await preprocessed_email_crud.get_distinct_values(session, column),
+                )
+                for column in CATEGORICAL_COLUMNS
+            }
+            async for rows in preprocessed_email_crud.stream_preprocessed_email_rows(
+                session,
+                EXPORT_COLUMNS,
+                skip=skip,
+                limit=_export_limit(limit),
+                filters=filters,
+            ):
+                batches.append(await asyncio.to_thread(_to_record_batch, rows, encoders))
+                rows_in_group += len(rows)
+                if rows_in_group >= project_settings.EXPORT_ROW_GROUP_SIZE:
+                    await asyncio.to_thread(_write_row_group, writer, batches)
+                    batches = []
+                    rows_in_group = 0
+        if batches:
+            await asyncio.to_thread(_write_row_group, writer, batches)
+    finally:
+        await asyncio.to_thread(writer.close)
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.string()),
+        ("date", pa.date32()),
+        ("fio", pa.string()),
+        ("object", pa.string()),
+        ("object_number", pa.string()),
+        ("object_type", category),
+        ("phone_number", pa.string()),
+        ("email", pa.string()),
+        ("emotional_color", category),
+        ("question", pa.string()),
+        ("short_question", pa.string()),
+    ])
+
+def _open_columnar_writer(output: BinaryIO, format: ExportFormat):
+    import pyarrow as pa
+
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(output, _arrow_schema(), compression="zstd")
+    # Словари категорий растут от пачки к пачке, в файле Arrow это delta-словари
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    return pa.ipc.new_file(output, _arrow_schema(), options=options)
+
+def _to_record_batch(rows: Sequence[Row], encoders: dict[str, "_CategoryEncoder"]):
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    columns = dict(zip(EXPORT_COLUMNS, zip(*rows, strict=True), strict=True))
+    columns["id"] = [str(value) for value in columns["id"]]
+    arrays = [
+        encoders[column].encode(columns[column])
+        if column in encoders
+        else pa.array(columns[column], type=schema.field(column).type)
+        for column in EXPORT_COLUMNS
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _write_row_group(writer, batches: list):
+    import pyarrow as pa
+
+    writer.write_table(pa.Table.from_batches(batches))
+
+class _CategoryEncoder:
+    """
+    Словарное кодирование категориальной колонки с общим для всей выгрузки
+    словарём. Значения, появившиеся во время выгрузки, дописываются в конец,
+    поэтому словарь следующей пачки продолжает предыдущий (delta-словарь в Arrow).
+    """
+
+    def __init__(self, values: Sequence[str]):
+        self._values = list(values)
+        self._indices = {value: index for index, value in enumerate(self._values)}
+
+    def encode(self, values: Sequence[str | None]):
+        import pyarrow as pa
+
+        indices = []
+        for value in values:
+            if value is not None and (index := self._indices.get(value)) is None:
+                index = self._indices[value] = len(self._values)
+                self._values.append(value)
+            indices.append(None if value is None else index)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()),
+            pa.array(self._values, type=pa.string()),
         )
-    output.seek(0)
-    return output
 
 async def send_email_to_user(
     email: str,
     subject: str,
     body: str,
-):
-    return await send_email(
+) -> str:
+    """Ставит письмо в очередь исходящих, возвращает id сообщения в очереди."""
+    return await get_email_outbox().send(
         email_to=email,
         subject=subject,
         html_content=body,
-    )
\ No newline at end of file
+    )
+
+async def send_answers(
+    session: AsyncSession,
+    answers: list[PreprocessedEmailAnswer],
+    subject: str,
+) -> dict[uuid.UUID, str]:
+    """
+    Ставит ответы на несколько обращений в очередь исходящих одной пачкой.
+    Возвращает id обращения -> id сообщения; неизвестные обращения пропускаются.
+    """
+    emails = await preprocessed_email_crud.get_preprocessed_emails_by_ids(
+        session,
+        [answer.preprocessed_email_id for answer in answers],
+    )
+    recipients = {email.id: email.email for email in emails}
+    answers = [answer for answer in answers if answer.preprocessed_email_id in recipients]
+    message_ids = await get_email_outbox().send_many([
+        (recipients[answer.preprocessed_email_id], subject, answer.answer_text)
+        for answer in answers
+    ])
+    return {
+        answer.preprocessed_email_id: message_id
+        for answer, message_id in zip(answers, message_ids, strict=True)
+    }
\ No newline at end of file
@@ -6,6 +6,7 @@ from src.app.core.security import verify_password
 from src.app.core.settings import get_project_settings
 from src.app.crud import user as user_crud
 from src.app.db.models.user import User, UserCreate, UserPublic, UsersPublic, UserUpdate
+from src.app.modules.counts import get_count_cache
 
 project_settings = get_project_settings()
 
@@ -13,7 +14,7 @@ async def authenticate(*, session: AsyncSession, email: str, password: str) -> U
     db_user = await user_crud.get_user(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    if not await verify_password(password, db_user.hashed_password):
         return None
     return db_user
 
@@ -31,9 +32,16 @@ async def get_users(
     limit: int = project_settings.DEFAULT_QUERY_LIMIT,
 ) -> UsersPublic:
     users = await user_crud.get_users(session, skip, limit)
+    # Таблица маленькая и редко анализируется, оценка планировщика для неё
+    # часто 0 или -1, поэтому всегда точный подсчёт (кэшируется до изменения)
+    count = await get_count_cache().get_or_count(
+        User.__tablename__,
+        {},
+        lambda: user_crud.count_users(session),
+    )
     return UsersPublic(
         data=[UserPublic.model_validate(user) for user in users],
-        count=len(users),
+        count=count,
     )
 
 async def create_user(
@@ -1,8 +1,10 @@
+import asyncio
+import smtplib
 from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
 
-import emails
-
-from src.app.core.settings import get_project_settings, get_smtp_settings
+from src.app.core.settings import SMTPSettings, get_project_settings, get_smtp_settings
 
 smtp_settings = get_smtp_settings()
 project_settings = get_project_settings()
@@ -14,20 +16,86 @@ class EmailData:
     subject: str
 
 
-async def send_email(
+def build_message(
     *,
     email_to: str,
     subject: str = "",
     html_content: str = "",
-):
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(smtp_settings.EMAILS_FROM_NAME, smtp_settings.EMAILS_FROM_EMAIL),
+) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr(
+        (smtp_settings.EMAILS_FROM_NAME, smtp_settings.EMAILS_FROM_EMAIL or smtp_settings.USER),
     )
-    smtp_options = {"host": smtp_settings.HOST, "port": smtp_settings.PORT}
-    smtp_options["user"] = smtp_settings.USER
-    smtp_options["password"] = smtp_settings.PASSWORD
-    smtp_options["tls"] = smtp_settings.TLS
-    response = message.send(to=email_to, smtp=smtp_options)
-    return response
+    message["To"] = email_to
+    message["Message-ID"] = make_msgid()
+    message.set_content(html_content, subtype="html")
+    return message
+
+
+class SMTPConnectionPool:
+    """
+    Пул постоянных SMTP-соединений: TLS-рукопожатие и логин выполняются
+    один раз на соединение, а не на каждое письмо.
+    smtplib синхронный, поэтому отправка выполняется в потоке.
+    """
+
+    def __init__(self, settings: SMTPSettings):
+        self._settings = settings
+        self._slots = asyncio.Semaphore(settings.POOL_SIZE)
+        self._idle: list[smtplib.SMTP] = []
+
+    async def send(self, message: EmailMessage) -> None:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            connection = await asyncio.to_thread(self._send, connection, message)
+            self._idle.append(connection)
+
+    async def close(self) -> None:
+        connections, self._idle = self._idle, []
+        for connection in connections:
+            await asyncio.to_thread(self._close, connection)
+
+    def _send(self, connection: smtplib.SMTP | None, message: EmailMessage) -> smtplib.SMTP:
+        if connection is not None:
+            try:
+                connection.send_message(message)
+                return connection
+            except smtplib.SMTPServerDisconnected:
+                # Сервер закрыл простаивавшее соединение - переподключаемся
+                pass
+            except smtplib.SMTPResponseException as e:
+                self._close(connection)
+                # 421: сервер закрывает простаивавшее соединение (smtplib отдаёт это
+                # как SMTPSenderRefused на MAIL FROM) - переподключаемся один раз
+                if e.smtp_code != 421:
+                    raise
+            except Exception:
+                self._close(connection)
+                raise
+        connection = self._connect()
+        try:
+            connection.send_message(message)
+        except Exception:
+            self._close(connection)
+            raise
+        return connection
+
+    def _connect(self) -> smtplib.SMTP:
+        settings = self._settings
+        if settings.SSL:
+            connection = smtplib.SMTP_SSL(settings.HOST, settings.PORT, timeout=settings.TIMEOUT)
+        else:
+            connection = smtplib.SMTP(settings.HOST, settings.PORT, timeout=settings.TIMEOUT)
+            if settings.TLS:
+                connection.starttls()
+        if settings.USER:
+            connection.login(settings.USER, settings.PASSWORD)
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
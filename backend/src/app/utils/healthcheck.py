@@ -1,19 +1,146 @@
-import asyncpg
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
 
-from src.app.core.settings import get_postgres_settings
+from sqlalchemy import text
 
-postgres_settings = get_postgres_settings()
+from src.app.core.settings import get_project_settings
+from src.app.db.database import async_engine
+from src.app.modules.gigachat import get_gigachat
+from src.app.modules.listener import get_mailbox_listener
+from src.app.modules.outbox import get_email_outbox
+from src.app.modules.queue import get_email_queue
 
-async def check_postgres():
+project_settings = get_project_settings()
+
+# Без этих зависимостей сервис не работает: их отказ - 503, остальные дают "degraded"
+CRITICAL_PROBES = ("postgres", "redis")
+
+
+async def check_postgres() -> bool:
+    # Соединение берётся из пула движка, а не открывается заново на каждую проверку
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return True
+
+
+async def check_redis() -> bool:
+    return await get_email_queue().ping()
+
+
+async def check_imap() -> bool:
+    # Ящик читает один процесс (владелец блокировки) и публикует статус сессии
+    # в Redis, поэтому новое IMAP-подключение не открываем
+    return (await get_mailbox_listener().shared_status()).get("connected", False)
+
+
+async def check_gigachat() -> bool:
+    await get_gigachat().ping()
+    return True
+
+
+PROBES: dict[str, Callable[[], Awaitable[bool]]] = {
+    "postgres": check_postgres,
+    "redis": check_redis,
+    "imap": check_imap,
+    "gigachat": check_gigachat,
+}
+
+
+async def _run_probe(name: str, probe: Callable[[], Awaitable[bool]], timeout: float) -> bool:
     try:
-        conn = await asyncpg.connect(
-            user=postgres_settings.USER,
-            password=postgres_settings.PASSWORD,
-            database=postgres_settings.DATABASE,
-            host=postgres_settings.SERVER,
-            port=postgres_settings.PORT,
-        )
-        await conn.close()
-        return True
-    except Exception:
+        return bool(await asyncio.wait_for(probe(), timeout))
+    except Exception as e:
+        logging.warning("Healthcheck probe %s failed: %r", name, e)
         return False
+
+
+def _queue_report(stats: dict, now: float) -> dict:
+    # Отставание воркера: сколько прошло с последнего ack, пока в очереди есть письма
+    backlog = stats["queued"] + stats["processing"]
+    last_ack_at = stats.pop("last_ack_at")
+    if not backlog:
+        lag = 0.0
+    elif last_ack_at is None:
+        lag = None
+    else:
+        lag = round(max(0.0, now - last_ack_at), 3)
+    return {**stats, "lag_seconds": lag}
+
+
+async def _collect_queues(timeout: float) -> dict[str, dict | None]:
+    async def collect(stats: Callable[[], Awaitable[dict]]) -> dict | None:
+        try:
+            return _queue_report(await asyncio.wait_for(stats(), timeout), time.time())
+        except Exception as e:
+            logging.warning("Healthcheck queue stats failed: %r", e)
+            return None
+
+    email_queue, email_outbox = await asyncio.gather(
+        collect(get_email_queue().stats),
+        collect(get_email_outbox().stats),
+    )
+    return {"email_queue": email_queue, "email_outbox": email_outbox}
+
+
+class HealthChecker:
+    """
+    Проверки зависимостей для /health.
+
+    Все проверки идут параллельно, каждая со своим таймаутом, так что одна
+    зависшая зависимость не задерживает ответ дольше HEALTH_PROBE_TIMEOUT.
+    Результат кешируется на HEALTH_CACHE_TTL секунд: частые запросы балансировщика
+    и мониторинга не создают нагрузку на БД, Redis и внешние сервисы. Конкурентные
+    запросы при истёкшем кеше ждут одну общую проверку.
+    """
+
+    def __init__(self, cache_ttl: float, probe_timeout: float):
+        self._cache_ttl = cache_ttl
+        self._probe_timeout = probe_timeout
+        self._lock = asyncio.Lock()
+        self._report: dict | None = None
+        self._checked_at = 0.0
+
+    async def check(self) -> dict:
+        if self._is_fresh():
+            return self._report
+        async with self._lock:
+            if not self._is_fresh():
+                self._report = await self._collect()
+                self._checked_at = time.monotonic()
+        return self._report
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._report is not None
+            and time.monotonic() - self._checked_at < self._cache_ttl
+        )
+
+    async def _collect(self) -> dict:
+        names = list(PROBES)
+        results, queues = await asyncio.gather(
+            asyncio.gather(
+                *(_run_probe(name, PROBES[name], self._probe_timeout) for name in names),
+            ),
+            _collect_queues(self._probe_timeout),
+        )
+        details = dict(zip(names, results, strict=True))
+        if not all(details[name] for name in CRITICAL_PROBES):
+            status = "unhealthy"
+        elif not all(details.values()):
+            status = "degraded"
+        else:
+            status = "healthy"
+        return {
+            "status": status,
+            "details": details,
+            "queues": queues,
+            "checked_at": time.time(),
+        }
+
+
+health_checker = HealthChecker(
+    cache_ttl=project_settings.HEALTH_CACHE_TTL,
+    probe_timeout=project_settings.HEALTH_PROBE_TIMEOUT,
+)
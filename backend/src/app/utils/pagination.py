@@ -0,0 +1,66 @@
+import base64
+import datetime
+import hashlib
+import json
+import uuid
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def encode_cursor(
+    value: Any,
+    id: uuid.UUID,
+    *,
+    sort_by: str,
+    order: str,
+    filters: dict[str, Any],
+) -> str:
+    """
+    Кодирует позицию (значение сортировки, id) последней строки страницы в непрозрачный токен.
+    Токен привязан к сортировке, направлению и набору фильтров запроса: с другими
+    параметрами та же позиция дала бы пропущенные или повторённые строки.
+    """
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    payload = json.dumps(
+        {
+            "sort": sort_by,
+            "order": order,
+            "filters": _filters_hash(filters),
+            "value": value,
+            "id": str(id),
+        },
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str,
+    *,
+    sort_by: str,
+    order: str,
+    filters: dict[str, Any],
+) -> tuple[Any, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if payload["sort"] != sort_by or payload["order"] != order:
+            raise ValueError("cursor was issued for another sort order")
+        if payload["filters"] != _filters_hash(filters):
+            raise ValueError("cursor was issued for other filters")
+        value = payload["value"]
+        if sort_by == "date":
+            value = datetime.date.fromisoformat(value)
+        return value, uuid.UUID(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid pagination cursor",
+        )
+
+
+def _filters_hash(filters: dict[str, Any]) -> str:
+    encoded = json.dumps(filters, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
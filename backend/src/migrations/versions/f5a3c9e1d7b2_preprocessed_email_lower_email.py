@@ -0,0 +1,31 @@
+"""preprocessed_email_lower_email
+
+Revision ID: f5a3c9e1d7b2
+Revises: e2d8c4b17a6f
+Create Date: 2026-10-18 18:42:10.512873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a3c9e1d7b2'
+down_revision: Union[str, Sequence[str], None] = 'e2d8c4b17a6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Фильтр по email сравнивает с нижним регистром: приводим к нему уже сохранённые строки
+    op.execute("UPDATE preprocessed_emails SET email = lower(email) WHERE email <> lower(email)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Исходный регистр не сохранялся, откатывать нечего
+    pass